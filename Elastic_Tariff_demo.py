@@ -2,7 +2,9 @@
 import sys
 from utils.es_helper import create_es_client
 import streamlit as st
-from utils.query_helper import search_tariffs
+from utils.query_helper import search_tariffs, prefetch_facets
+from utils.es_config import show_facets
+from utils.fusion import fusion_methods
 
 
 # Initialize these variables with default values at the start of the script
@@ -10,6 +12,7 @@ BM25_Boost = 0
 KNN_Boost = 0
 rrf_rank_constant = 0
 rrf_window_size = 0
+fusion_method = "rrf"
 
 # Connect to Elasticsearch
 try:
@@ -59,7 +62,7 @@ with col2:
         searchtype = col2a.radio(
             "Search Method:",
             ("GenAI", "BM25", "Vector", "Vector OpenAI", "Elser", "Vector Hybrid", "Elser Hybrid",
-             "Reciprocal Rank Fusion"),
+             "Reciprocal Rank Fusion", "Client Fusion"),
             index=1  # Default to "BM25"
         )
 
@@ -110,6 +113,31 @@ with col2:
                 help="Determines size of individual result sets per query. Higher values improve relevance but may reduce performance."
             )
 
+        if searchtype == "Client Fusion":
+            fusion_method = col2b.selectbox(
+                "Fusion Method:",
+                fusion_methods,
+                help="How the BM25, MiniLM kNN and ELSER rankings are combined. Weights are set in utils/es_config.py."
+            )
+
+            rrf_rank_constant = col2b.slider(
+                "Rank Constant:",
+                min_value=1,
+                max_value=100,
+                value=60,
+                step=1,
+                help="RRF rank constant. Higher values flatten the difference between top and lower ranks."
+            )
+
+            rrf_window_size = col2b.slider(
+                "Window Size",
+                min_value=10,
+                max_value=200,
+                value=50,
+                step=1,
+                help="Number of hits fetched from each retriever before fusing."
+            )
+
     # Check if searchtype has changed
     if searchtype != st.session_state.get('previous_searchtype', None):
         st.session_state.search_clicked = False
@@ -149,24 +177,36 @@ with col2:
             selected_states = ["" if state == "Not Available" else state for state in selected_states]
             selected_companies = ["" if company == "Not Available" else company for company in selected_companies]
 
+            # Facet counts only depend on the filters, so they are fetched while the search runs
+            if show_facets and searchtype != "GenAI":
+                facets = prefetch_facets(es, searchtype, selected_authors, selected_states, selected_companies)
+
             processed_results, original_results = search_tariffs(es, user_query, searchtype, BM25_Boost, KNN_Boost,
                                                                  rrf_rank_constant, rrf_window_size, selected_authors,
-                                                                 selected_states, selected_companies)
+                                                                 selected_states, selected_companies,
+                                                                 fusion_method=fusion_method)
+
+            if searchtype == "Client Fusion":
+                retrievers = original_results.get('fusion', {}).get('retrievers', {})
+                st.caption(" | ".join(
+                    f"{name}: {retriever['took_ms']:.0f} ms" + (" (dropped)" if retriever.get('dropped') else "")
+                    for name, retriever in retrievers.items() if retriever.get('took_ms') is not None))
 
-            # Retrieve the author buckets from original_results
+            # Retrieve the author buckets from the facet request
             if searchtype != "GenAI":
-                author_buckets = original_results.get('aggregations', {}).get('author_facet', {}).get('buckets', [])
+                aggregations = facets.result() if show_facets else {}
+                author_buckets = aggregations.get('author_facet', {}).get('buckets', [])
                 author_names = [bucket['key'] if bucket['key'] != "" else "Not Available" for bucket in author_buckets]
 
-                state_buckets = original_results.get('aggregations', {}).get('state_facet', {}).get('buckets', [])
+                state_buckets = aggregations.get('state_facet', {}).get('buckets', [])
                 state_names = [bucket['key'] if bucket['key'] != "" else "Not Available" for bucket in state_buckets]
 
                 # company_buckets = original_results.get('aggregations', {}).get('company_facet', {}).get('buckets', [])
                 # company_names = [bucket['key'] if bucket['key'] != "" else "Not Available" for bucket in company_buckets]
 
                 ##new code
-                # Extract companies from the original_results aggregations
-                company_buckets = original_results.get('aggregations', {}).get('company_facet', {}).get('buckets', [])
+                # Extract companies from the facet aggregations
+                company_buckets = aggregations.get('company_facet', {}).get('buckets', [])
                 existing_companies = [bucket['key'] for bucket in company_buckets]
 
                 # Extract companies from processed_results
@@ -224,10 +264,9 @@ with col2:
         else:
             st.error("Please enter a question before searching.")
 
-##Uncomment if you want facets to be displayed
-_ = '''
+# Set show_facets in utils/es_config.py to display facets
 # Only display the authors and states sections if the Search button has been clicked
-if st.session_state.search_clicked:
+if show_facets and st.session_state.search_clicked:
     with col1:
         if searchtype != "Vector OpenAI":
             st.markdown("### Authors")
@@ -249,5 +288,4 @@ if st.session_state.search_clicked:
             for state in st.session_state.state_names:
                 if state not in st.session_state.state_checks:
                     st.session_state.state_checks[state] = False
-                st.session_state.state_checks[state] = st.checkbox(state, value=st.session_state.state_checks[state], key=f"state_{state}") 
-'''
+                st.session_state.state_checks[state] = st.checkbox(state, value=st.session_state.state_checks[state], key=f"state_{state}")
@@ -0,0 +1,196 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+from elasticsearch import Elasticsearch
+
+from benchmarks.fake_bulk_server import serve_forever
+from benchmarks.synthetic_tariffs import generate_documents, profile_mappings
+from utils.ingest_engine import ingest_file
+from utils.ndjson_utils import available_decoders, dumps, open_ndjson_writer
+
+
+def _int_list(value):
+    return [int(item) for item in value.split(",") if item]
+
+
+def _str_list(value):
+    return [item for item in value.split(",") if item]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Measure ingest throughput against a local fake _bulk endpoint.")
+    parser.add_argument("--profiles", type=_str_list, default=["bym", "elser", "ada002"],
+                        help="Comma separated ingest profiles whose mapping shapes the synthetic documents.")
+    parser.add_argument("--docs", type=int, default=5000, help="Synthetic documents per corpus.")
+    parser.add_argument("--text-words", type=int, default=250, help="Words per text body, controls document size.")
+    parser.add_argument("--thread-counts", type=_int_list, default=[1, 2, 4], help="Comma separated thread counts.")
+    parser.add_argument("--chunk-sizes", type=_int_list, default=[250, 500, 1000],
+                        help="Comma separated bulk chunk sizes.")
+    parser.add_argument("--decoders", type=_str_list, default=list(available_decoders()),
+                        help="Comma separated NDJSON decoders. Defaults to every installed one.")
+    parser.add_argument("--parse-workers", type=int, default=1, help="Parse processes per run.")
+    parser.add_argument("--adaptive", action="store_true", help="Use the adaptive bulk indexer.")
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="Latency the fake server adds per _bulk.")
+    parser.add_argument("--reject-rate", type=float, default=0.0,
+                        help="Fraction of bulk items the fake server rejects with 429.")
+    parser.add_argument("--work-dir", default="../output/bench", help="Where the synthetic corpora are cached.")
+    parser.add_argument("--output", help="Write the results as JSON to this file.")
+    parser.add_argument("--baseline", help="Results JSON of an earlier run to compare docs/s against.")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="Fail when docs/s drops by more than this fraction versus the baseline.")
+    return parser.parse_args(argv)
+
+
+def build_corpus(profile, docs, text_words, work_dir):
+    """Writes (once) and returns the NDJSON corpus for a profile and size."""
+    os.makedirs(work_dir, exist_ok=True)
+    path = os.path.join(work_dir, f"synthetic-{profile}-{docs}-{text_words}.ndjson")
+    if not os.path.exists(path):
+        tmp_path = f"{path}.tmp"
+        with open_ndjson_writer(tmp_path) as f:
+            for document in generate_documents(profile, docs, text_words=text_words):
+                f.write(dumps(document) + b"\n")
+        os.replace(tmp_path, path)
+    return path
+
+
+def _cpu_seconds(usage):
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_case(case, url, results):
+    """
+    Runs one combination in a fresh process, so peak RSS and CPU time belong to that combination only.
+    CPU includes parse worker processes; the fake server runs in its own process and is not counted.
+    """
+    es = Elasticsearch(url, request_timeout=120)
+    es.indices.create(index=case["index"])
+
+    # Interpreter start-up and imports are not part of the measurement
+    cpu_before = _cpu_seconds(resource.getrusage(resource.RUSAGE_SELF)) + \
+        _cpu_seconds(resource.getrusage(resource.RUSAGE_CHILDREN))
+    started = time.monotonic()
+    success_count, failed_count = ingest_file(es, case["file_path"], case["index"], decoder=case["decoder"],
+                                              parse_workers=case["parse_workers"],
+                                              thread_count=case["thread_count"], chunk_size=case["chunk_size"],
+                                              adaptive=case["adaptive"])
+    elapsed = time.monotonic() - started
+
+    cpu = _cpu_seconds(resource.getrusage(resource.RUSAGE_SELF)) + \
+        _cpu_seconds(resource.getrusage(resource.RUSAGE_CHILDREN)) - cpu_before
+    peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                   resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    results.put({
+        "success": success_count,
+        "failed": failed_count,
+        "seconds": elapsed,
+        "docs_per_second": success_count / max(elapsed, 1e-9),
+        "mb_per_second": os.path.getsize(case["file_path"]) / 1024 / 1024 / max(elapsed, 1e-9),
+        # Cores kept busy on average, and the same spread over every core of the machine
+        "cpu_cores": cpu / max(elapsed, 1e-9),
+        "cpu_per_core": cpu / max(elapsed, 1e-9) / (os.cpu_count() or 1),
+        # ru_maxrss is in KB on Linux
+        "peak_rss_mb": peak_rss / 1024
+    })
+
+
+def case_key(case):
+    return f"{case['profile']}/t{case['thread_count']}/c{case['chunk_size']}/{case['decoder']}"
+
+
+def compare_to_baseline(results, baseline_path, max_regression):
+    """Prints docs/s changes versus a baseline. Returns the keys that regressed by more than max_regression."""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = {result["key"]: result for result in json.load(f)["results"]}
+
+    regressions = []
+    for result in results:
+        before = baseline.get(result["key"])
+        if not before:
+            continue
+        change = result["docs_per_second"] / max(before["docs_per_second"], 1e-9) - 1
+        print(f"{result['key']:<40} {before['docs_per_second']:>10.0f} -> {result['docs_per_second']:>10.0f} "
+              f"docs/s ({change:+.1%})")
+        if change < -max_regression:
+            regressions.append(result["key"])
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    for profile in args.profiles:
+        if profile not in profile_mappings:
+            raise ValueError(f"Invalid profile: {profile}. Expected one of {', '.join(profile_mappings)}")
+
+    context = multiprocessing.get_context("spawn")
+    port_queue = context.Queue()
+    server = context.Process(target=serve_forever, args=(args.latency_ms / 1000, args.reject_rate, port_queue),
+                             daemon=True)
+    server.start()
+    url = f"http://127.0.0.1:{port_queue.get(timeout=30)}"
+    print(f"Fake _bulk endpoint at {url} ({args.latency_ms}ms latency, {args.reject_rate:.1%} rejected)")
+
+    results = []
+    try:
+        for profile in args.profiles:
+            file_path = build_corpus(profile, args.docs, args.text_words, args.work_dir)
+            for thread_count, chunk_size, decoder in itertools.product(args.thread_counts, args.chunk_sizes,
+                                                                       args.decoders):
+                case = {
+                    "profile": profile,
+                    "file_path": file_path,
+                    "index": f"bench-{profile}",
+                    "thread_count": thread_count,
+                    "chunk_size": chunk_size,
+                    "decoder": decoder,
+                    "parse_workers": args.parse_workers,
+                    "adaptive": args.adaptive
+                }
+                result_queue = context.Queue()
+                worker = context.Process(target=run_case, args=(case, url, result_queue))
+                worker.start()
+                result = result_queue.get()
+                worker.join()
+
+                result.update({key: value for key, value in case.items() if key != "file_path"})
+                result["key"] = case_key(case)
+                results.append(result)
+    finally:
+        server.terminate()
+
+    print()
+    print(f"{'profile':<8} {'threads':>7} {'chunk':>6} {'decoder':<8} {'docs/s':>9} {'MB/s':>7} "
+          f"{'cores':>6} {'cpu/core':>8} {'rss MB':>7} {'failed':>6}")
+    for result in results:
+        print(f"{result['profile']:<8} {result['thread_count']:>7} {result['chunk_size']:>6} "
+              f"{result['decoder']:<8} {result['docs_per_second']:>9.0f} {result['mb_per_second']:>7.1f} "
+              f"{result['cpu_cores']:>6.2f} {result['cpu_per_core']:>8.1%} {result['peak_rss_mb']:>7.0f} "
+              f"{result['failed']:>6}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                "docs": args.docs,
+                "text_words": args.text_words,
+                "latency_ms": args.latency_ms,
+                "reject_rate": args.reject_rate,
+                "cpu_count": os.cpu_count(),
+                "results": results
+            }, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        regressions = compare_to_baseline(results, args.baseline, args.max_regression)
+        if regressions:
+            print(f"Throughput regressed by more than {args.max_regression:.0%} for: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
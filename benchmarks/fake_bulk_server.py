@@ -0,0 +1,113 @@
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class FakeElasticsearchHandler(BaseHTTPRequestHandler):
+    """
+    Just enough of the Elasticsearch REST API for the ingest path: cluster info, index create/exists/delete
+    and _bulk. Bulk requests sleep for the configured latency and reject items with the configured rate.
+    """
+
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+    reject_rate = 0.0
+    indices = set()
+    lock = threading.Lock()
+    stats = {"bulk_requests": 0, "items": 0, "rejected": 0, "bytes": 0}
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=None):
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("X-Elastic-Product", "Elasticsearch")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(payload)
+
+    def _index_name(self):
+        return self.path.split("?")[0].strip("/").split("/")[0]
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_HEAD(self):
+        self._send(200 if self._index_name() in self.indices else 404)
+
+    def do_GET(self):
+        self._send(200, {"name": "fake", "cluster_name": "bench", "version": {"number": "8.11.0"},
+                         "tagline": "You Know, for Search"})
+
+    def do_DELETE(self):
+        self.indices.discard(self._index_name())
+        self._send(200, {"acknowledged": True})
+
+    def do_PUT(self):
+        if "_bulk" in self.path:
+            return self._bulk()
+        self._read_body()
+        if "_settings" not in self.path:
+            self.indices.add(self._index_name())
+        self._send(200, {"acknowledged": True})
+
+    def do_POST(self):
+        if "_bulk" in self.path:
+            return self._bulk()
+        self._read_body()
+        self._send(200, {"acknowledged": True})
+
+    def _bulk(self):
+        body = self._read_body()
+        if self.latency:
+            time.sleep(self.latency)
+
+        items = []
+        lines = iter(body.splitlines())
+        for line in lines:
+            if not line.strip():
+                continue
+            op_type, meta = next(iter(json.loads(line).items()))
+            if op_type != "delete":
+                next(lines, None)  # The source line is not needed to answer
+            if self.reject_rate and random.random() < self.reject_rate:
+                items.append({op_type: {"_index": meta.get("_index"), "status": 429, "error": {
+                    "type": "es_rejected_execution_exception", "reason": "rejected by fake bulk server"}}})
+            else:
+                items.append({op_type: {"_index": meta.get("_index"), "_id": meta.get("_id"), "status": 201,
+                                        "result": "created"}})
+
+        rejected = sum(1 for item in items if next(iter(item.values()))["status"] == 429)
+        with self.lock:
+            self.stats["bulk_requests"] += 1
+            self.stats["items"] += len(items)
+            self.stats["rejected"] += rejected
+            self.stats["bytes"] += len(body)
+        self._send(200, {"took": int(self.latency * 1000), "errors": bool(rejected), "items": items})
+
+
+def start_fake_server(latency=0.0, reject_rate=0.0, host="127.0.0.1", port=0):
+    """Starts the fake server on a background thread. Returns the server; its URL is http://host:server_port."""
+    handler = type("ConfiguredHandler", (FakeElasticsearchHandler,), {
+        "latency": latency,
+        "reject_rate": reject_rate,
+        "indices": set(),
+        "lock": threading.Lock(),
+        "stats": {"bulk_requests": 0, "items": 0, "rejected": 0, "bytes": 0}
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def serve_forever(latency, reject_rate, port_queue):
+    """Entry point for running the fake server in its own process, so it does not skew client CPU numbers."""
+    server = start_fake_server(latency, reject_rate)
+    port_queue.put(server.server_port)
+    threading.Event().wait()
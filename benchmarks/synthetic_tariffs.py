@@ -0,0 +1,75 @@
+import math
+import random
+
+from utils.es_config import byom_mapping, elser_mapping, ada002_mapping
+
+profile_mappings = {
+    "bym": byom_mapping,
+    "elser": elser_mapping,
+    "ada002": ada002_mapping
+}
+
+_words = ("tariff rate schedule gas pipeline transportation service shipper capacity firm interruptible "
+          "storage injection withdrawal demethanized isobutane propane ethane texas louisiana oklahoma "
+          "regulatory commission filing effective superseded charge surcharge fuel retention nomination "
+          "delivery receipt point zone mainline lateral imbalance penalty credit").split()
+_states = ("TX", "LA", "OK", "NM", "CO", "KS", "WY", "PA")
+_companies = ("Acme Pipeline", "Gulf Midstream", "Prairie Gas", "Lone Star Transmission", "Bayou Storage")
+
+
+def _text(rng, words):
+    return " ".join(rng.choice(_words) for _ in range(words))
+
+
+def _vector(rng, dims):
+    values = [rng.gauss(0.0, 1.0) for _ in range(dims)]
+    norm = math.sqrt(sum(value * value for value in values)) or 1.0
+    return [value / norm for value in values]
+
+
+def _value(name, spec, rng, text_words):
+    field_type = spec.get("type")
+    if field_type is None and "properties" in spec:
+        return _document(spec["properties"], rng, text_words)
+    if field_type == "dense_vector":
+        return _vector(rng, spec["dims"])
+    if field_type == "rank_features":
+        return {rng.choice(_words) + str(i): round(rng.uniform(0.01, 3.0), 4) for i in range(rng.randint(60, 140))}
+    if field_type == "boolean":
+        return rng.random() < 0.5
+    if field_type == "long":
+        return rng.randint(0, 5000)
+    if field_type == "date":
+        return f"20{rng.randint(10, 23)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T00:00:00Z"
+    # text / keyword: long content for the searched body fields, short values elsewhere
+    if name in ("text", "text_field", "content", "summary"):
+        return _text(rng, text_words)
+    if name == "state":
+        return rng.choice(_states)
+    if name == "company":
+        return rng.choice(_companies)
+    return _text(rng, rng.randint(1, 6))
+
+
+def _document(properties, rng, text_words):
+    return {name: _value(name, spec, rng, text_words) for name, spec in properties.items()}
+
+
+def generate_documents(profile, count, seed=42, text_words=250):
+    """
+    Yields count synthetic tariff chunks shaped like the profile's mapping in utils/es_config.py.
+
+    Every mapped field is filled with a value of its type, including dense vectors of the mapped dims and
+    ELSER-like rank_features maps, so payload sizes track the real exports.
+    """
+    rng = random.Random(seed)
+    properties = profile_mappings[profile]["properties"]
+    for i in range(count):
+        document = _document(properties, rng, text_words)
+        metadata = document.get("metadata")
+        if isinstance(metadata, dict):
+            metadata["id"] = f"synthetic-{i // 10}"
+            metadata["chunk"] = i % 10
+        else:
+            document["id"] = f"synthetic-{i // 10}"
+        yield document
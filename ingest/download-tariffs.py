@@ -1,5 +1,7 @@
-import os
-import requests
+import argparse
+
+from utils.download_utils import download_all
+from utils.ndjson_utils import compression_suffixes
 
 urls = [
     "https://sunmanapp.blob.core.windows.net/publicstuff/workplace-app-tariffs-bym.json",
@@ -12,21 +14,30 @@ urls = [
 
 output_dir = "../output"
 
-# Ensure the output directory exists
-if not os.path.exists(output_dir):
-    os.makedirs(output_dir)
 
-for url in urls:
-    response = requests.get(url)
-    response.raise_for_status()  # Raise an exception for HTTP errors
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Download the tariff exports.")
+    parser.add_argument("--url", dest="urls", action="append",
+                        help="URL to download. Repeatable. Defaults to the published tariff exports.")
+    parser.add_argument("--sha256", nargs=2, action="append", default=[], metavar=("URL", "SHA256"),
+                        help="Expected sha256 of a URL's body. Repeatable.")
+    parser.add_argument("--output-dir", default=output_dir, help="Directory the files are written to.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of concurrent downloads.")
+    parser.add_argument("--keep-compressed", action="store_true",
+                        help="Store .gz/.zst sources as-is instead of decompressing them.")
+    parser.add_argument("--store-compression", default="none", choices=sorted(compression_suffixes),
+                        help="Store plain sources compressed (e.g. zst). Ingest reads compressed files directly.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
 
-    # Extract the filename from the URL and join it with the output directory
-    filename = os.path.join(output_dir, os.path.basename(url))
+    download_all(args.urls or urls, args.output_dir, max_workers=args.workers, checksums=dict(args.sha256),
+                 decompress=not args.keep_compressed, store_compression=args.store_compression)
 
-    # Write the content to the file
-    with open(filename, 'wb') as file:
-        file.write(response.content)
+    print("All downloads completed!")
 
-    print(f"Downloaded {url} to {filename}")
 
-print("All downloads completed!")
+if __name__ == "__main__":
+    main()
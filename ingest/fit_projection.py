@@ -0,0 +1,62 @@
+import argparse
+import json
+import os
+import time
+
+from utils.es_config import vector_embedding_field
+from utils.projection_utils import fit_projection, save_projection, project, projection_methods
+from utils.vector_eval import load_vectors, split_queries, top_k, recall_at_k
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Fit a dimensionality reduction for ada-002 vectors and report recall and latency per size.")
+    parser.add_argument("--file", required=True,
+                        help="Exported vectors: a .npy matrix, or an NDJSON file (with or without a vector sidecar).")
+    parser.add_argument("--field", default=vector_embedding_field, help="Vector field of inline NDJSON vectors.")
+    parser.add_argument("--dims", default="256,512,768", help="Comma separated target dimensions.")
+    parser.add_argument("--method", default="pca", choices=projection_methods, help="Projection method.")
+    parser.add_argument("--limit", type=int, help="Only use the first LIMIT vectors.")
+    parser.add_argument("--queries", type=int, default=200,
+                        help="Vectors held out of the fit and used as queries for the report.")
+    parser.add_argument("--k", type=int, default=10, help="Recall is measured over the top k.")
+    parser.add_argument("--output-dir", default="../output", help="Where the projection files are written.")
+    parser.add_argument("--report", help="Also write the report as JSON to this file.")
+    return parser.parse_args(argv)
+
+
+def _search_ms(queries, corpus, k):
+    started = time.perf_counter()
+    results = top_k(queries, corpus, k)
+    return results, (time.perf_counter() - started) * 1000 / len(queries)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    corpus, queries = split_queries(load_vectors(args.file, args.field, args.limit), args.queries)
+    print(f"{len(corpus)} vectors of {corpus.shape[1]} dims, {len(queries)} held-out queries.")
+
+    # ada-002 vectors are unit length and searched with dot_product; the projections keep that property
+    exact, full_ms = _search_ms(queries, corpus, args.k)
+    report = [{"dims": corpus.shape[1], "recall": 1.0, "query_ms": full_ms, "file": None}]
+    os.makedirs(args.output_dir, exist_ok=True)
+    for dims in [int(value) for value in args.dims.split(",")]:
+        projection = fit_projection(corpus, dims, args.method)
+        path = os.path.join(args.output_dir, f"ada002-projection-{args.method}-{dims}.npz")
+        save_projection(projection, path)
+
+        found, ms = _search_ms(project(queries, projection), project(corpus, projection), args.k)
+        report.append({"dims": dims, "recall": recall_at_k(found, exact), "query_ms": ms, "file": path})
+
+    print(f"{'dims':>6} {'recall@' + str(args.k):>10} {'ms/query':>9} {'vector bytes':>12}  file")
+    for row in report:
+        print(f"{row['dims']:>6} {row['recall']:>10.3f} {row['query_ms']:>9.2f} {row['dims'] * 4:>12}  "
+              f"{row['file'] or '(full vectors)'}")
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump({"file": args.file, "method": args.method, "k": args.k, "results": report}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
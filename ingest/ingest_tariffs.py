@@ -0,0 +1,116 @@
+import argparse
+import sys
+
+from utils.es_helper import create_es_client
+from utils.ingest_engine import ingest_profiles, run_ingest, default_thread_count, default_chunk_size, \
+    default_max_chunk_bytes, default_queue_size
+from utils.dedup_utils import dedup_modes
+from utils.mapping_utils import vector_index_types
+from utils.ndjson_utils import available_decoders
+from utils.openai_embedder import configure_openai
+import streamlit as st
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk load tariff NDJSON exports into Elasticsearch.")
+    parser.add_argument("--profile", required=True, choices=sorted(ingest_profiles),
+                        help="Target index profile.")
+    parser.add_argument("--file", dest="file_paths", action="append",
+                        help="NDJSON file to load. Repeatable. Defaults to the profile's export under ../output.")
+    parser.add_argument("--thread-count", type=int, default=default_thread_count,
+                        help="Number of parallel bulk threads.")
+    parser.add_argument("--chunk-size", type=int, default=default_chunk_size,
+                        help="Maximum number of documents per bulk request.")
+    parser.add_argument("--max-chunk-bytes", type=int, default=default_max_chunk_bytes,
+                        help="Maximum size of a bulk request in bytes.")
+    parser.add_argument("--queue-size", type=int, default=default_queue_size,
+                        help="Number of chunks queued ahead of the bulk threads.")
+    parser.add_argument("--decoder", default="auto", choices=["auto"] + available_decoders(),
+                        help="JSON decoder used to parse the input.")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="Size bulk requests by bytes and tune them and the thread count from cluster "
+                             "latency and 429 rejections. --chunk-size and --queue-size are ignored.")
+    parser.add_argument("--max-thread-count", type=int,
+                        help="Upper bound for the adaptive thread count. Defaults to 4x --thread-count.")
+    parser.add_argument("--parse-workers", type=int, default=1,
+                        help="Number of processes decoding the NDJSON input. 1 decodes on the main thread.")
+    parser.add_argument("--keep-existing", action="store_true",
+                        help="Do not delete the index if it already exists.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Keep the index, send only new or changed documents and delete removed ones, "
+                             "based on the local manifest of indexed content hashes.")
+    parser.add_argument("--manifest",
+                        help="Path of the manifest database. Defaults to <index>.manifest.sqlite next to the input.")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Zero-downtime rebuild: load a new versioned index with refresh and replicas "
+                             "disabled, then atomically move the alias to it and drop the old generation.")
+    parser.add_argument("--force-merge", action="store_true",
+                        help="With --rebuild, force-merge the new generation to one segment before the swap.")
+    parser.add_argument("--no-resume", dest="resume", action="store_false",
+                        help="Discard existing checkpoints and ingest every file from the start.")
+    parser.add_argument("--checkpoint-every", type=int, default=5000,
+                        help="Save the byte-offset checkpoint after this many acknowledged documents.")
+    parser.add_argument("--embed-missing", action="store_true",
+                        help="Embed records that have no vector yet (ada002 profile) while they are ingested.")
+    parser.add_argument("--embed-batch-size", type=int, default=64,
+                        help="Records per embedding batch; each batch is packed into as few API requests as fit.")
+    parser.add_argument("--embed-concurrency", type=int, default=4,
+                        help="Embedding batches in flight. All of them share one rate limit.")
+    parser.add_argument("--dedup", choices=dedup_modes,
+                        help="Drop near-duplicate chunks, or mark them with metadata.canonical_id. "
+                             "A <file>.dedup.json report shows the space saved.")
+    parser.add_argument("--dedup-threshold", type=float, default=0.85,
+                        help="Estimated word-shingle Jaccard similarity at which two chunks count as duplicates.")
+    parser.add_argument("--vector-index-type", choices=vector_index_types,
+                        help="dense_vector index_options type for a newly created index. int8_hnsw and int4_hnsw "
+                             "keep 4x / 8x less vector data in memory; see vector_recall.py for the recall cost.")
+    parser.add_argument("--vector-confidence-interval", type=float,
+                        help="Quantile range used to quantize vectors with --vector-index-type int8/int4_hnsw.")
+    parser.add_argument("--projection",
+                        help="Projection file from fit_projection.py. Vectors are reduced with it and the index is "
+                             "created with the reduced dims (ada002 profile). Set the same file as "
+                             "ada002_projection_path in utils/es_config.py for the app's queries.")
+    parser.add_argument("--openai-api-base",
+                        help="Embedding endpoint base URL, e.g. a local stub server. Defaults to variables.py.")
+    parser.add_argument("--openai-api-key", help="API key for --openai-api-base. Defaults to the 'pass' secret.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    try:
+        username = st.secrets['es_username']
+        password = st.secrets['es_password']
+        cloudid = st.secrets['es_cloudid']
+
+        # get es object
+        es = create_es_client(username, password, cloudid)
+
+        print(es.info())
+    except Exception as e:
+        print("Connection failed", str(e))
+        sys.exit(1)
+
+    if args.openai_api_base or args.openai_api_key:
+        configure_openai(args.openai_api_base, args.openai_api_key)
+
+    kwargs = {}
+    if args.keep_existing:
+        kwargs["delete_existing"] = False
+
+    run_ingest(es, args.profile, file_paths=args.file_paths, thread_count=args.thread_count,
+               chunk_size=args.chunk_size, max_chunk_bytes=args.max_chunk_bytes, queue_size=args.queue_size,
+               decoder=args.decoder, resume=args.resume, checkpoint_every=args.checkpoint_every,
+               parse_workers=args.parse_workers, incremental=args.incremental, manifest_path=args.manifest,
+               rebuild=args.rebuild, force_merge=args.force_merge,
+               adaptive=args.adaptive, max_thread_count=args.max_thread_count,
+               embed_missing=args.embed_missing, embed_batch_size=args.embed_batch_size,
+               embed_concurrency=args.embed_concurrency, dedup=args.dedup, dedup_threshold=args.dedup_threshold,
+               vector_index_type=args.vector_index_type, vector_confidence_interval=args.vector_confidence_interval,
+               projection_path=args.projection,
+               **kwargs)
+
+
+if __name__ == "__main__":
+    main()
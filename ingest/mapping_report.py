@@ -0,0 +1,48 @@
+import argparse
+import itertools
+import json
+
+from utils.es_config import byom_schema, elser_schema, ada002_schema
+from utils.es_schema import build_mapping, estimate_mapping_savings
+from utils.ingest_engine import ingest_profiles
+from utils.ndjson_utils import iter_ndjson, resolve_ndjson_path
+
+profile_schemas = {
+    "bym": byom_schema,
+    "elser": elser_schema,
+    "ada002": ada002_schema
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Estimate the index size saved by the role-based mappings over the original text+keyword ones.")
+    parser.add_argument("--profile", required=True, choices=sorted(profile_schemas), help="Index profile.")
+    parser.add_argument("--file", help="Sample NDJSON. Defaults to the profile's export under ../output.")
+    parser.add_argument("--limit", type=int, default=5000, help="Number of sample records to read.")
+    parser.add_argument("--top", type=int, default=15, help="Number of fields listed in the breakdown.")
+    parser.add_argument("--print-mapping", action="store_true", help="Also print the generated mapping.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    schema = profile_schemas[args.profile]
+    file_path = resolve_ndjson_path(args.file or ingest_profiles[args.profile]["file_paths"][0])
+
+    report = estimate_mapping_savings(schema, itertools.islice(iter_ndjson(file_path), args.limit))
+    per_record = max(report["records"], 1)
+    print(f"{report['records']} sample records from {file_path}")
+    print(f"Estimated index bytes per record (excluding _source and vectors): "
+          f"{report['legacy_bytes'] / per_record:.0f} -> {report['lean_bytes'] / per_record:.0f} "
+          f"({report['saved_fraction']:.1%} smaller)")
+    print(f"{'field':<36} {'legacy':>10} {'lean':>10}")
+    for row in report["fields"][:args.top]:
+        print(f"{row['field']:<36} {row['legacy_bytes'] / per_record:>10.1f} {row['lean_bytes'] / per_record:>10.1f}")
+
+    if args.print_mapping:
+        print(json.dumps(build_mapping(schema), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+import argparse
+
+from utils.es_config import vector_embedding_field
+from utils.vector_sidecar import split_vectors, vector_dtypes
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Convert an NDJSON export with inline vectors into NDJSON plus a memory-mapped .npy sidecar.")
+    parser.add_argument("--src", required=True, help="NDJSON file with inline vectors.")
+    parser.add_argument("--dest", required=True, help="NDJSON file to write without the vectors.")
+    parser.add_argument("--field", default=vector_embedding_field, help="Dotted path of the vector field.")
+    parser.add_argument("--dtype", default="float32", choices=vector_dtypes, help="Storage type of the vectors.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    count = split_vectors(args.src, args.dest, args.field, args.dtype)
+    print(f"Wrote {count} records to {args.dest} with vectors in its .vectors.npy sidecar.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import json
+
+from utils.es_config import vector_embedding_field
+from utils.ingest_engine import ingest_profiles
+from utils.mapping_utils import iter_dense_vector_fields
+from utils.vector_eval import load_vectors, split_queries, evaluate_quantization, similarities
+
+
+def _profile_similarity(profile):
+    for _, spec in iter_dense_vector_fields(ingest_profiles[profile]["mapping"]):
+        return spec["similarity"]
+    raise ValueError(f"Ingest profile {profile} has no dense_vector field")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure recall@k of int8/int4 quantized against float vector search on exported vectors.")
+    parser.add_argument("--file", required=True,
+                        help="Exported vectors: a .npy matrix, or an NDJSON file (with or without a vector sidecar).")
+    parser.add_argument("--field", default=vector_embedding_field, help="Vector field of inline NDJSON vectors.")
+    parser.add_argument("--profile", choices=sorted(ingest_profiles), default="ada002",
+                        help="Ingest profile whose mapping gives the similarity function.")
+    parser.add_argument("--similarity", choices=similarities, help="Overrides the profile's similarity.")
+    parser.add_argument("--limit", type=int, help="Only use the first LIMIT vectors.")
+    parser.add_argument("--queries", type=int, default=200, help="Vectors held out as queries.")
+    parser.add_argument("--k", type=int, default=10, help="Recall is measured over the top k.")
+    parser.add_argument("--oversample", default="1,2,4",
+                        help="Comma separated candidate multipliers that are rescored with the float vectors.")
+    parser.add_argument("--confidence-interval", type=float,
+                        help="Quantile range of the quantization. Defaults to Elasticsearch's 1 - 1/(dims + 1).")
+    parser.add_argument("--output", help="Also write the results as JSON to this file.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    similarity = args.similarity or _profile_similarity(args.profile)
+
+    corpus, queries = split_queries(load_vectors(args.file, args.field, args.limit), args.queries)
+    print(f"{len(corpus)} vectors of {corpus.shape[1]} dims, {len(queries)} held-out queries, {similarity}.")
+    results = evaluate_quantization(corpus, queries, k=args.k, similarity=similarity,
+                                    oversample=[int(factor) for factor in args.oversample.split(",")],
+                                    confidence_interval=args.confidence_interval)
+
+    print(f"{'index type':<11} {'oversample':>10} {'recall@' + str(args.k):>10} {'bytes/vector':>12} {'ms/query':>9}")
+    for result in results:
+        print(f"{result['index_type']:<11} {result['oversample']:>10} {result['recall']:>10.3f} "
+              f"{result['bytes_per_vector']:>12.0f} {result['query_ms']:>9.2f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"file": args.file, "similarity": similarity, "k": args.k, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+from elasticsearch import ConnectionTimeout
+
+from utils.fusion import multi_search
+
+
+class FakeMsearchES:
+    """Answers _msearch with responses, or times out when responses is None."""
+
+    def __init__(self, responses=None):
+        self.responses = responses
+        self.options_kwargs = None
+        self.searches = None
+
+    def options(self, **kwargs):
+        self.options_kwargs = kwargs
+        return self
+
+    def msearch(self, searches, filter_path=None):
+        self.searches = searches
+        if self.responses is None:
+            raise ConnectionTimeout("timed out")
+        return {"responses": self.responses}
+
+
+retrievers = [("bm25", "tariffs", {"timeout": "250ms"}), ("elser", "tariffs-elser", {"timeout": "250ms"})]
+
+
+def test_deadline_cuts_off_the_round_trip():
+    es = FakeMsearchES([{"took": 5, "hits": {"hits": [{"_id": "a"}]}}, {"took": 240, "timed_out": True}])
+
+    hits, report = multi_search(es, retrievers, deadline_ms=500)
+    assert es.options_kwargs == {"request_timeout": 0.5, "max_retries": 0}
+    assert all(header["allow_partial_search_results"] for header in es.searches[0::2])
+    assert hits == {"bm25": [{"_id": "a"}]}
+    assert report["elser"]["dropped"] and report["elser"]["timed_out"]
+
+
+def test_late_msearch_drops_every_retriever():
+    hits, report = multi_search(FakeMsearchES(), retrievers, deadline_ms=500)
+    assert hits == {}
+    assert all(report[name]["dropped"] for name, _, _ in retrievers)
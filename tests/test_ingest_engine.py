@@ -0,0 +1,128 @@
+import json
+
+from utils.ingest_engine import ingest_file, delete_stale_documents, generate_actions
+from utils.manifest_utils import IngestManifest
+from utils.vector_sidecar import split_vectors
+
+
+class FakeBulkES:
+    """Answers _bulk requests, failing the documents whose _id is in fail_ids."""
+
+    def __init__(self, fail_ids=()):
+        self.fail_ids = set(fail_ids)
+        self.operations = []
+
+    def bulk(self, operations):
+        items = []
+        position = 0
+        while position < len(operations):
+            op_type, meta = next(iter(json.loads(operations[position]).items()))
+            position += 1 if op_type == "delete" else 2
+            self.operations.append((op_type, meta["_id"]))
+            status = 500 if meta["_id"] in self.fail_ids else 200
+            items.append({op_type: {"_id": meta["_id"], "status": status}})
+        return {"errors": False, "items": items}
+
+
+def write_chunks(path, texts):
+    with open(path, "w", encoding="utf-8") as f:
+        for chunk, text in enumerate(texts):
+            f.write(json.dumps({"metadata": {"id": "tariff", "chunk": chunk}, "text_field": text}) + "\n")
+
+
+def run(es, file_path, manifest, incremental):
+    manifest.begin_run(resume=False)
+    ingest_file(es, file_path, "tariffs", manifest=manifest, incremental=incremental, adaptive=True)
+    deleted = delete_stale_documents(es, "tariffs", manifest, adaptive=True) if incremental else 0
+    manifest.finish_run()
+    return deleted
+
+
+def test_records_without_chunk_sharing_an_id_stay_apart(tmp_path):
+    file_path = str(tmp_path / "tariffs-ada.json")
+    with open(file_path, "w", encoding="utf-8") as f:
+        for content in ["first", "second", "first"]:
+            f.write(json.dumps({"id": "demethanized receipt", "content": content}) + "\n")
+
+    doc_ids = [action["_id"] for action in generate_actions(file_path, "tariffs")]
+    assert all(doc_id.startswith("demethanized receipt:") for doc_id in doc_ids)
+    # Identical records still share an _id, so a re-run overwrites them in place
+    assert doc_ids[0] != doc_ids[1] and doc_ids[0] == doc_ids[2]
+
+
+def test_failed_update_in_incremental_run_is_not_deleted(tmp_path):
+    file_path = str(tmp_path / "tariffs.json")
+    manifest = IngestManifest(str(tmp_path / "tariffs.manifest.sqlite"))
+
+    write_chunks(file_path, ["first", "second", "third"])
+    run(FakeBulkES(), file_path, manifest, incremental=False)
+
+    # The changed chunk fails to update; its previous version is still indexed
+    write_chunks(file_path, ["first", "second, amended", "third"])
+    es = FakeBulkES(fail_ids={"tariff:1"})
+    deleted = run(es, file_path, manifest, incremental=True)
+    assert deleted == 0
+    assert ("delete", "tariff:1") not in es.operations
+    assert es.operations == [("index", "tariff:1")]
+
+    # The next incremental run sends the update again
+    es = FakeBulkES()
+    assert run(es, file_path, manifest, incremental=True) == 0
+    assert es.operations == [("index", "tariff:1")]
+    manifest.close()
+
+
+def test_unchanged_records_skip_record_stages(tmp_path):
+    file_path = str(tmp_path / "tariffs.json")
+    manifest = IngestManifest(str(tmp_path / "tariffs.manifest.sqlite"))
+    staged = []
+
+    def stage(lines):
+        for end_offset, line_number, record in lines:
+            staged.append(record["text_field"])
+            record["vector"] = [0.0]
+            yield end_offset, line_number, record
+
+    write_chunks(file_path, ["first", "second", "third"])
+    manifest.begin_run(resume=False)
+    ingest_file(FakeBulkES(), file_path, "tariffs", manifest=manifest, record_stages=[stage], adaptive=True)
+    manifest.finish_run()
+    assert staged == ["first", "second", "third"]
+
+    staged.clear()
+    write_chunks(file_path, ["first", "second, amended", "third"])
+    es = FakeBulkES()
+    manifest.begin_run(resume=False)
+    ingest_file(es, file_path, "tariffs", manifest=manifest, incremental=True, record_stages=[stage],
+                adaptive=True)
+    manifest.finish_run()
+    assert staged == ["second, amended"]
+    assert es.operations == [("index", "tariff:1")]
+    manifest.close()
+
+
+def test_toggling_a_record_stage_does_not_resend_unchanged_records(tmp_path):
+    # ada-002 style records without a chunk number, with their vectors in a sidecar
+    source_path = str(tmp_path / "export.json")
+    with open(source_path, "w", encoding="utf-8") as f:
+        for number, content in enumerate(["first", "second", "third"]):
+            f.write(json.dumps({"id": "tariff", "content": content, "vector": [float(number), 1.0]}) + "\n")
+    file_path = str(tmp_path / "tariffs-ada.json")
+    split_vectors(source_path, file_path, "vector")
+    manifest = IngestManifest(str(tmp_path / "tariffs.manifest.sqlite"))
+
+    def project(lines):
+        for end_offset, line_number, record in lines:
+            record["vector"] = record["vector"][:1]
+            yield end_offset, line_number, record
+
+    run(FakeBulkES(), file_path, manifest, incremental=False)
+    for record_stages in ([project], None):
+        es = FakeBulkES()
+        manifest.begin_run(resume=False)
+        ingest_file(es, file_path, "tariffs", manifest=manifest, incremental=True, record_stages=record_stages,
+                    adaptive=True)
+        assert delete_stale_documents(es, "tariffs", manifest, adaptive=True) == 0
+        manifest.finish_run()
+        assert es.operations == []
+    manifest.close()
@@ -0,0 +1,93 @@
+import pytest
+
+pytest.importorskip("openai")
+pytest.importorskip("streamlit")
+
+from utils import query_helper
+from utils.result_cache import SearchResultCache
+
+
+class FakeIndices:
+    def get_settings(self, index, name):
+        return {index: {"settings": {"index": {"uuid": "generation-1"}}}}
+
+
+class FakeSearchES:
+    """Answers every search with response and counts the calls."""
+
+    def __init__(self, response):
+        self.response = response
+        self.indices = FakeIndices()
+        self.searches = 0
+
+    def search(self, **kwargs):
+        self.searches += 1
+        return self.response
+
+
+def hit(text):
+    return {"_id": text, "_score": 1.0, "_source": {"text_field": text, "metadata": {}}}
+
+
+@pytest.fixture
+def completions(monkeypatch):
+    """Replaces the OpenAI completions with one canned answer per result."""
+    calls = []
+
+    def guidance(user_query, results, num_results, searchtype):
+        calls.append(num_results)
+        # Like the openai_helper functions, only the first num_results hits are read
+        return [(results["hits"]["hits"][idx]["_source"]["text_field"], "answer") for idx in range(num_results)], \
+            results
+
+    monkeypatch.setattr(query_helper, "get_openai_guidance", guidance)
+    monkeypatch.setattr(query_helper, "search_cache", SearchResultCache(ttl=600))
+    return calls
+
+
+def search(es, user_query="gas tariffs"):
+    return query_helper.search_tariffs(es, user_query, "BM25", 1, 1, 60, 20, [], [], [])
+
+
+def test_search_cache_miss_then_hit(completions):
+    es = FakeSearchES({"took": 2, "timed_out": False, "hits": {"hits": [hit("first"), hit("second")]}})
+
+    processed_results, _ = search(es)
+    assert processed_results == [("first", "answer"), ("second", "answer")]
+    assert es.searches == 1
+
+    # Same query up to case and spacing: served from the cache without searching or completing again
+    cached_results, _ = search(es, "  Gas   Tariffs ")
+    assert cached_results == processed_results
+    assert es.searches == 1
+    assert completions == [2]
+
+
+def test_incomplete_results_are_not_cached(completions, monkeypatch):
+    es = FakeSearchES({"took": 2, "timed_out": False, "hits": {"hits": [hit("first"), hit("second")]}})
+    # One of the two completions failed
+    monkeypatch.setattr(query_helper, "get_openai_guidance",
+                        lambda user_query, results, num_results, searchtype: ([("first", "answer")], results))
+
+    search(es)
+    search(es)
+    assert es.searches == 2
+
+
+def test_empty_result_is_cached(completions):
+    es = FakeSearchES({"took": 2, "timed_out": False, "hits": {"hits": []}})
+
+    assert search(es)[0] == []
+    assert search(es)[0] == []
+    assert es.searches == 1
+    assert completions == [0]
+
+
+def test_zero_hit_filter_path_response(completions):
+    # With filter_path, Elasticsearch leaves out "hits" altogether when nothing matched
+    es = FakeSearchES({"took": 2, "timed_out": False})
+
+    assert search(es)[0] == []
+    assert search(es)[0] == []
+    assert es.searches == 1
+    assert completions == [0]
@@ -1,13 +1,198 @@
-from elasticsearch import helpers
+import random
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
+from elasticsearch import ApiError, helpers
 
-def bulk_index_to_es(es, records, index_name):
+from utils.ndjson_utils import dumps
+
+REJECTED_STATUS = 429
+REJECTED_ERROR_TYPE = "es_rejected_execution_exception"
+
+
+def _is_rejected(item_result):
+    error = item_result.get("error")
+    return item_result.get("status") == REJECTED_STATUS or \
+        (isinstance(error, dict) and error.get("type") == REJECTED_ERROR_TYPE)
+
+
+def _serialize_action(action, index_name=None):
+    """Returns the (header_line, body_line) bytes of one bulk action; body_line is None for deletes."""
+    header, body = helpers.expand_action(action)
+    if index_name:
+        op_meta = next(iter(header.values()))
+        op_meta.setdefault("_index", index_name)
+    header_line = dumps(header)
+    if body is None:
+        return header_line, None
+    return header_line, body if isinstance(body, bytes) else dumps(body)
+
+
+class AdaptiveBulkIndexer:
+    """
+    Bulk indexer that sizes requests by serialized bytes instead of a fixed document count.
+
+    After every request it adjusts the byte target and the number of concurrent requests:
+    fast responses grow both, slow responses shrink the byte target, and 429 /
+    es_rejected_execution_exception responses back off hard. Only the rejected items of a
+    request are retried. Results are yielded in input order, like helpers.parallel_bulk.
+    """
+
+    def __init__(self, es, index_name=None, target_bytes=5 * 1024 * 1024, min_bytes=256 * 1024,
+                 max_bytes=50 * 1024 * 1024, max_chunk_docs=10000, concurrency=2, min_concurrency=1,
+                 max_concurrency=8, target_latency=1.0, max_retries=8, initial_backoff=0.5, max_backoff=30.0,
+                 report_every=10.0):
+        self.es = es
+        self.index_name = index_name
+        self.max_bytes = max_bytes
+        self.min_bytes = min(min_bytes, max_bytes)
+        self.target_bytes = min(max(target_bytes, self.min_bytes), max_bytes)
+        self.max_chunk_docs = max_chunk_docs
+        self.concurrency = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+        self.max_retries = max_retries
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.report_every = report_every
+
+        self.docs_sent = 0
+        self.bytes_sent = 0
+        self.rejections = 0
+        self._started = None
+        self._last_report = None
+
+    def _backoff(self, attempt):
+        delay = min(self.max_backoff, self.initial_backoff * (2 ** attempt))
+        time.sleep(delay * random.uniform(0.5, 1.0))
+
+    def _send_chunk(self, chunk):
+        """
+        Sends one chunk, retrying rejected items until they succeed or retries run out.
+
+        Returns:
+        - A (results, latency, rejected) tuple with one (success, info) per document in chunk order.
+        """
+        results = [None] * len(chunk)
+        outstanding = list(range(len(chunk)))
+        latency = 0.0
+        rejected = 0
+
+        for attempt in range(self.max_retries + 1):
+            operations = []
+            for position in outstanding:
+                header_line, body_line = chunk[position]
+                operations.append(header_line)
+                if body_line is not None:
+                    operations.append(body_line)
+
+            started = time.monotonic()
+            try:
+                resp = self.es.bulk(operations=operations)
+            except ApiError as e:
+                if e.status_code != REJECTED_STATUS or attempt == self.max_retries:
+                    raise
+                # The whole request was rejected, so everything is still outstanding
+                rejected += len(outstanding)
+                self._backoff(attempt)
+                continue
+            latency = time.monotonic() - started
+
+            retry = []
+            for position, item in zip(outstanding, resp["items"]):
+                op_type, item_result = item.popitem()
+                if _is_rejected(item_result) and attempt < self.max_retries:
+                    retry.append(position)
+                    continue
+                ok = 200 <= item_result.get("status", 500) < 300
+                results[position] = (ok, {op_type: item_result})
+
+            rejected += len(retry)
+            outstanding = retry
+            if not outstanding:
+                break
+            self._backoff(attempt)
+
+        return results, latency, rejected
+
+    def _adapt(self, latency, rejected):
+        if rejected:
+            self.rejections += rejected
+            self.target_bytes = max(self.min_bytes, self.target_bytes // 2)
+            self.concurrency = max(self.min_concurrency, self.concurrency - 1)
+        elif latency > self.target_latency:
+            self.target_bytes = max(self.min_bytes, int(self.target_bytes * 0.75))
+        elif latency < self.target_latency / 2:
+            if self.target_bytes < self.max_bytes:
+                self.target_bytes = min(self.max_bytes, int(self.target_bytes * 1.25))
+            else:
+                self.concurrency = min(self.max_concurrency, self.concurrency + 1)
+
+    def _report(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_report < self.report_every:
+            return
+        self._last_report = now
+        elapsed = max(now - self._started, 1e-9)
+        print(f"Bulk progress: {self.docs_sent} docs, {self.docs_sent / elapsed:.0f} docs/s, "
+              f"{self.bytes_sent / elapsed / (1024 * 1024):.2f} MB/s, chunk target "
+              f"{self.target_bytes / (1024 * 1024):.2f} MB, concurrency {self.concurrency}, "
+              f"{self.rejections} rejections retried")
+
+    def _chunks(self, actions):
+        chunk = []
+        chunk_bytes = 0
+        for action in actions:
+            header_line, body_line = _serialize_action(action, self.index_name)
+            chunk.append((header_line, body_line))
+            chunk_bytes += len(header_line) + 1 + (len(body_line) + 1 if body_line is not None else 0)
+            # target_bytes is read per document so adjustments apply to the chunk being built
+            if chunk_bytes >= self.target_bytes or len(chunk) >= self.max_chunk_docs:
+                yield chunk, chunk_bytes
+                chunk = []
+                chunk_bytes = 0
+        if chunk:
+            yield chunk, chunk_bytes
+
+    def bulk(self, actions):
+        """Indexes actions and yields one (success, info) tuple per action, in input order."""
+        self._started = self._last_report = time.monotonic()
+        pending = deque()
+
+        def drain():
+            future, chunk_size, chunk_bytes = pending.popleft()
+            results, latency, rejected = future.result()
+            self.docs_sent += chunk_size
+            self.bytes_sent += chunk_bytes
+            self._adapt(latency, rejected)
+            self._report()
+            return results
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            for chunk, chunk_bytes in self._chunks(actions):
+                pending.append((pool.submit(self._send_chunk, chunk), len(chunk), chunk_bytes))
+                while len(pending) >= self.concurrency:
+                    yield from drain()
+            while pending:
+                yield from drain()
+
+        self._report(force=True)
+
+
+def adaptive_bulk(es, actions, index_name=None, **kwargs):
+    """Convenience wrapper around AdaptiveBulkIndexer.bulk."""
+    return AdaptiveBulkIndexer(es, index_name=index_name, **kwargs).bulk(actions)
+
+
+def bulk_index_to_es(es, records, index_name, **kwargs):
 
     successes = 0
     failed_count = 0
 
-    # Using parallel_bulk for improved throughput
-    for success, info in helpers.parallel_bulk(es, records, index=index_name, thread_count=4, chunk_size=500):
+    # Chunks are sized by payload bytes and tuned from cluster latency and rejections
+    for success, info in adaptive_bulk(es, records, index_name=index_name, **kwargs):
         if not success:
             print("A document failed:", info)
             failed_count += 1
@@ -0,0 +1,88 @@
+import json
+import os
+import time
+
+
+def default_checkpoint_path(file_path):
+    return f"{file_path}.checkpoint.json"
+
+
+class IngestCheckpoint:
+    """
+    Persists the last fully acknowledged byte offset and line number of an NDJSON file.
+
+    The checkpoint is a small JSON sidecar next to the input file. It is tied to the target index
+    and to the size/mtime of the input, so a re-downloaded export never resumes from a stale offset.
+    """
+
+    def __init__(self, file_path, target_index, checkpoint_path=None, save_every_docs=5000,
+                 save_every_seconds=10.0):
+        self.file_path = file_path
+        self.target_index = target_index
+        self.checkpoint_path = checkpoint_path or default_checkpoint_path(file_path)
+        self.save_every_docs = save_every_docs
+        self.save_every_seconds = save_every_seconds
+        self.offset = 0
+        self.line_number = 0
+        self.acknowledged = 0
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+
+    def _file_identity(self):
+        stat = os.stat(self.file_path)
+        return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+    def load(self):
+        """
+        Loads a previous checkpoint if one matches this file and index.
+
+        Returns:
+        - A (offset, line_number) tuple; (0, 0) when there is nothing to resume.
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return 0, 0
+
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+
+        identity = self._file_identity()
+        if state.get("index") != self.target_index or state.get("file") != identity:
+            print(f"Ignoring checkpoint {self.checkpoint_path}: it belongs to a different file or index.")
+            return 0, 0
+
+        self.offset = state["offset"]
+        self.line_number = state["line"]
+        self.acknowledged = state.get("acknowledged", 0)
+        return self.offset, self.line_number
+
+    def mark(self, offset, line_number):
+        """Records that every document up to offset has been acknowledged, saving periodically."""
+        self.offset = offset
+        self.line_number = line_number
+        self.acknowledged += 1
+        self._unsaved += 1
+        if self._unsaved >= self.save_every_docs or \
+                time.monotonic() - self._last_save >= self.save_every_seconds:
+            self.save()
+
+    def save(self):
+        if not self._unsaved and os.path.exists(self.checkpoint_path):
+            return
+        state = {
+            "index": self.target_index,
+            "file": self._file_identity(),
+            "offset": self.offset,
+            "line": self.line_number,
+            "acknowledged": self.acknowledged
+        }
+        # Write then rename so a crash mid-save never leaves a truncated checkpoint behind
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.checkpoint_path)
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+
+    def clear(self):
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
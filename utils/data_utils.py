@@ -1,36 +1,90 @@
+import re
+import time
+
 import pandas as pd
-from utils.openai_embedder import get_embedding
+from utils.bulk_utils import bulk_index_to_es
 
+# Mapping the platform_choice string to its corresponding platform value
+platform_mapping = {
+    "xbox": "XBOX",
+    "ps": "PS",
+    "nintendo": "NINTENDO"
+}
 
-def prepare_data(file_path: str, platform_choice: str):
-    df = pd.read_csv(file_path)
+# Only the title column is read from the source catalogs, as a string column
+source_columns = ['name']
+source_dtypes = {'name': 'string'}
 
-    # Mapping the platform_choice string to its corresponding platform value
-    platform_mapping = {
-        "xbox": "XBOX",
-        "ps": "PS",
-        "nintendo": "NINTENDO"
-    }
+default_chunksize = 50000
 
-    # Update platform column based on user's choice
-    df['platform'] = platform_mapping.get(platform_choice, "UNKNOWN")
+_non_alphanumeric = re.compile(r'[^a-zA-Z0-9\s]+')
+_whitespace = re.compile(r'\s+')
 
-    df['name'] = df['name'].str.replace(r'[^a-zA-Z0-9\s]', '', regex=True).str.replace(r'\s+', ' ',
-                                                                                       regex=True).str.strip()
 
-    # Rename 'name' column to 'game_title'
-    df = df.rename(columns={'name': 'game_title'})
+def _add_timing(timings, stage, started):
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
 
-    # Select required columns
-    df = df[['game_title', 'platform']]
 
-    df.fillna("UNKNOWN", inplace=True)
+def iter_prepared_chunks(file_path: str, platform_choice: str, chunksize: int = default_chunksize, timings=None):
+    """
+    Reads a source catalog in chunks of chunksize rows and cleans each one.
 
-    # Create a new column 'openai_vector' and set its value based on the embedding of the 'name' column
-    #df['openai_vector'] = df['game_title'].apply(get_embedding)
+    Yields DataFrames with game_title and platform columns. Time spent reading and cleaning is added to
+    the "read" and "clean" entries of timings when a dict is given.
+    """
+    platform = platform_mapping.get(platform_choice, "UNKNOWN")
+
+    started = time.perf_counter()
+    reader = pd.read_csv(file_path, usecols=source_columns, dtype=source_dtypes, chunksize=chunksize)
+    for df in reader:
+        _add_timing(timings, "read", started)
+
+        started = time.perf_counter()
+        titles = df['name'].str.replace(_non_alphanumeric, '', regex=True) \
+            .str.replace(_whitespace, ' ', regex=True).str.strip()
+        chunk = pd.DataFrame({'game_title': titles.fillna("UNKNOWN"), 'platform': platform})
+
+        # Create a new column 'openai_vector' and set its value based on the embedding of the 'name' column
+        #chunk['openai_vector'] = chunk['game_title'].apply(get_embedding)
+        _add_timing(timings, "clean", started)
+
+        yield chunk
+        started = time.perf_counter()
 
-    records = df.to_dict(orient='records')
-    print("number of records")
-    print(len(records))
 
-    return records
+def prepare_data(file_path: str, platform_choice: str, chunksize: int = default_chunksize, timings=None):
+    """
+    Streams the cleaned records of a source catalog, one chunk in memory at a time.
+
+    Returns:
+    - A generator of record dictionaries, ready to be passed to bulk_index_to_es.
+    """
+    for chunk in iter_prepared_chunks(file_path, platform_choice, chunksize, timings):
+        started = time.perf_counter()
+        records = chunk.to_dict(orient='records')
+        _add_timing(timings, "to_records", started)
+        yield from records
+
+
+def load_catalog(es, file_path: str, platform_choice: str, index_name: str, chunksize: int = default_chunksize,
+                 **kwargs):
+    """
+    Prepares a source catalog and bulk indexes it while it is being read, so memory stays flat.
+
+    Prints the time spent per stage; "index" is whatever the bulk sender took on top of preparation.
+    Returns:
+    - A (success_count, failed_count) tuple.
+    """
+    timings = {}
+    started = time.perf_counter()
+    success_count, failed_count = bulk_index_to_es(es, prepare_data(file_path, platform_choice, chunksize, timings),
+                                                   index_name, **kwargs)
+    total = time.perf_counter() - started
+    timings["index"] = max(total - sum(timings.values()), 0.0)
+
+    print("number of records")
+    print(success_count + failed_count)
+    print("Stage timings: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+          + f", total {total:.2f}s")
+    return success_count, failed_count
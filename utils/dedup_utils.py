@@ -0,0 +1,149 @@
+import json
+import re
+import zlib
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from utils.manifest_utils import document_id
+from utils.ndjson_utils import dumps
+from utils.vector_sidecar import get_field, set_field
+
+canonical_id_field = "metadata.canonical_id"
+dedup_modes = ("drop", "mark")
+
+_mersenne_prime = (1 << 61) - 1
+_max_hash = (1 << 32) - 1
+_word = re.compile(r"\w+")
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Near-duplicate detection needs numpy. Install it with `pip install numpy`.")
+
+
+def shingles(text, size=5):
+    """Hashes of the overlapping size-word shingles of text; short texts form a single shingle."""
+    words = _word.findall(text.lower())
+    if len(words) <= size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)}
+
+
+def lsh_bands(threshold, num_perm):
+    """
+    (bands, rows) with bands * rows <= num_perm whose S-curve threshold (1/bands)^(1/rows) is closest
+    to the requested Jaccard similarity.
+    """
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        distance = abs((1 / bands) ** (1 / rows) - threshold)
+        if best is None or distance < best[0]:
+            best = (distance, bands, rows)
+    return best[1], best[2]
+
+
+class NearDuplicateDetector:
+    """
+    MinHash / LSH near-duplicate detection over a stream of texts.
+
+    The first text of a cluster becomes its canonical document. A later text whose MinHash estimate of
+    word-shingle Jaccard similarity to an earlier canonical text reaches threshold is reported as a
+    duplicate of it. Only canonical signatures are kept (num_perm * 4 bytes each).
+    """
+
+    def __init__(self, threshold=0.85, num_perm=128, shingle_size=5, seed=1):
+        _require_numpy()
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        # Banding for a lower similarity than the threshold trades a few more candidate checks for
+        # hardly any missed duplicates; candidates are verified against the full signature anyway
+        self.bands, self.rows = lsh_bands(threshold * 0.8, num_perm)
+        rng = np.random.RandomState(seed)
+        # a, b < 2^31 and shingle hashes < 2^32 keep a * x + b inside uint64
+        self._a = rng.randint(1, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=num_perm, dtype=np.uint64)
+        self._buckets = [{} for _ in range(self.bands)]
+        self._signatures = {}
+
+    def signature(self, text):
+        values = np.fromiter(shingles(text, self.shingle_size), dtype=np.uint64)
+        hashes = (np.outer(values, self._a) + self._b) % np.uint64(_mersenne_prime) & np.uint64(_max_hash)
+        return hashes.min(axis=0).astype(np.uint32)
+
+    def find_or_add(self, doc_id, text):
+        """Returns the canonical id text duplicates, or None after registering doc_id as a new canonical one."""
+        signature = self.signature(text)
+        keys = [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+        candidates = []
+        for bucket, key in zip(self._buckets, keys):
+            candidate = bucket.get(key)
+            if candidate is not None and candidate not in candidates:
+                candidates.append(candidate)
+        for candidate in candidates:
+            if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                return candidate
+
+        self._signatures[doc_id] = signature
+        for bucket, key in zip(self._buckets, keys):
+            bucket.setdefault(key, doc_id)
+        return None
+
+
+def dedup_records(lines, text_field, mode="drop", threshold=0.85, num_perm=128, report_path=None):
+    """
+    Pipeline stage that removes (mode "drop") or flags (mode "mark") near-duplicate records.
+
+    lines yields (end_offset, line_number, record) tuples like iter_ndjson_lines. Marked duplicates get
+    metadata.canonical_id set to the _id of the first near-identical record; canonical records pass
+    through unchanged. Records without text are never duplicates. At the end the space saved is printed
+    and, with report_path, written as JSON. Detection state lives in memory, so a resumed ingest only
+    compares against records seen since the restart.
+    """
+    if mode not in dedup_modes:
+        raise ValueError(f"Invalid dedup mode: {mode}. Expected one of {', '.join(dedup_modes)}")
+    detector = NearDuplicateDetector(threshold, num_perm)
+    total_count = 0
+    total_bytes = 0
+    duplicate_count = 0
+    duplicate_bytes = 0
+    clusters = Counter()
+
+    for end_offset, line_number, record in lines:
+        source = dumps(record)
+        total_count += 1
+        total_bytes += len(source)
+        text = get_field(record, text_field)
+        canonical_id = detector.find_or_add(document_id(record, source), text) if text else None
+        if canonical_id is not None:
+            duplicate_count += 1
+            duplicate_bytes += len(source)
+            clusters[canonical_id] += 1
+            if mode == "drop":
+                continue
+            set_field(record, canonical_id_field, canonical_id)
+        yield end_offset, line_number, record
+
+    report = {
+        "text_field": text_field,
+        "mode": mode,
+        "threshold": threshold,
+        "records": total_count,
+        "duplicates": duplicate_count,
+        "source_bytes": total_bytes,
+        "duplicate_bytes": duplicate_bytes,
+        "saved_fraction": duplicate_bytes / total_bytes if total_bytes else 0.0,
+        "largest_clusters": [{"canonical_id": doc_id, "duplicates": count}
+                             for doc_id, count in clusters.most_common(20)]
+    }
+    print(f"Near-duplicates: {duplicate_count} of {total_count} records "
+          f"({duplicate_bytes / 1024 / 1024:.1f} MB, {report['saved_fraction']:.1%} of the source) "
+          f"{'dropped' if mode == 'drop' else 'marked with ' + canonical_id_field}.")
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,217 @@
+import base64
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from utils.ndjson_utils import compression_suffixes, is_compressed, open_ndjson_reader, open_ndjson_writer
+
+
+def build_session(pool_size=8, retries=3):
+    """requests session with a connection pool sized for concurrent downloads and retries on 5xx/429."""
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=("GET", "HEAD"))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _read_meta(meta_path):
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_meta(meta_path, meta):
+    tmp_path = f"{meta_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
+
+
+def _hash_existing(path, hashers):
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            for hasher in hashers:
+                hasher.update(block)
+
+
+def _with_marker(path, marker):
+    """Inserts marker before a compression suffix, e.g. x.json.gz -> x.json.part.gz, so readers still detect it."""
+    if is_compressed(path):
+        stem, suffix = os.path.splitext(path)
+        return f"{stem}.{marker}{suffix}"
+    return f"{path}.{marker}"
+
+
+def _range_total(content_range):
+    """Total size from a Content-Range header such as "bytes */1234", or None."""
+    if not content_range or "/" not in content_range:
+        return None
+    total = content_range.rsplit("/", 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+
+def _transcode(src_path, dest_path):
+    """Streams src_path into dest_path, decompressing and compressing by their suffixes."""
+    tmp_path = _with_marker(dest_path, "tmp")
+    with open_ndjson_reader(src_path) as src, open_ndjson_writer(tmp_path) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(tmp_path, dest_path)
+
+
+def download_file(session, url, output_dir, expected_sha256=None, decompress=True, store_compression="none",
+                  chunk_size=64 * 1024, timeout=60):
+    """
+    Streams one URL to output_dir.
+
+    - Unchanged files are skipped with a conditional request (ETag / Last-Modified from the last download).
+    - An interrupted download leaves a .part file that is resumed with an HTTP Range request. A .part that
+      already holds the whole body (416 answer) is verified and finalized; any other 416 restarts the download.
+    - The body is verified against expected_sha256 and, when the server sends one, Content-MD5.
+    - .gz and .zst sources are decompressed into the file name without the suffix unless decompress is False.
+    - store_compression ("gz" or "zst") stores plain sources compressed, e.g. x.json -> x.json.zst.
+      Ingest and export read either form transparently.
+
+    Returns:
+    - A (path, status) tuple where status is "downloaded" or "unchanged".
+    """
+    raw_name = os.path.basename(urlparse(url).path)
+    if is_compressed(raw_name):
+        dest_name = os.path.splitext(raw_name)[0] if decompress else raw_name
+    else:
+        dest_name = raw_name + compression_suffixes[store_compression]
+    dest_path = os.path.join(output_dir, dest_name)
+    part_path = _with_marker(os.path.join(output_dir, raw_name), "part")
+    meta_path = f"{dest_path}.meta.json"
+    part_meta_path = f"{part_path}.meta.json"
+
+    # Identity encoding keeps byte offsets meaningful for Range requests
+    headers = {"Accept-Encoding": "identity"}
+    meta = _read_meta(meta_path)
+    if os.path.exists(dest_path) and meta.get("url") == url:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    part_meta = _read_meta(part_meta_path)
+    resume_from = os.path.getsize(part_path) if os.path.exists(part_path) and part_meta.get("url") == url else 0
+    if resume_from:
+        headers["Range"] = f"bytes={resume_from}-"
+        # Only continue the partial file if the remote object is still the same one
+        validator = part_meta.get("etag") or part_meta.get("last_modified")
+        if validator:
+            headers["If-Range"] = validator
+
+    restart = False
+    with session.get(url, headers=headers, stream=True, timeout=timeout) as response:
+        if response.status_code == 304:
+            return dest_path, "unchanged"
+
+        sha256 = hashlib.sha256()
+        md5 = hashlib.md5()
+        if response.status_code == 416 and resume_from:
+            # Nothing is left past the end of the .part file: it is either complete or no longer matches
+            _hash_existing(part_path, (sha256, md5))
+            total = _range_total(response.headers.get("Content-Range"))
+            if total == resume_from or \
+                    (total is None and expected_sha256 and sha256.hexdigest() == expected_sha256.lower()):
+                print(f"{part_path} already holds all of {url}.")
+            else:
+                restart = True
+        else:
+            response.raise_for_status()
+            if response.status_code == 206:
+                print(f"Resuming {url} at byte {resume_from}...")
+                _hash_existing(part_path, (sha256, md5))
+                mode = 'ab'
+            else:
+                mode = 'wb'
+                part_meta = {
+                    "url": url,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                    "content_md5": response.headers.get("Content-MD5")
+                }
+                _write_meta(part_meta_path, part_meta)
+
+            with open(part_path, mode) as file:
+                for block in response.iter_content(chunk_size=chunk_size):
+                    file.write(block)
+                    sha256.update(block)
+                    md5.update(block)
+
+    if restart:
+        print(f"Discarding {part_path}: the server cannot resume {url} at byte {resume_from}.")
+        os.remove(part_path)
+        if os.path.exists(part_meta_path):
+            os.remove(part_meta_path)
+        return download_file(session, url, output_dir, expected_sha256, decompress, store_compression, chunk_size,
+                             timeout)
+
+    digest = sha256.hexdigest()
+    if expected_sha256 and digest != expected_sha256.lower():
+        os.remove(part_path)
+        raise ValueError(f"Checksum mismatch for {url}: expected {expected_sha256}, got {digest}")
+    if part_meta.get("content_md5") and base64.b64encode(md5.digest()).decode() != part_meta["content_md5"]:
+        os.remove(part_path)
+        raise ValueError(f"Content-MD5 mismatch for {url}")
+
+    if dest_name == raw_name:
+        os.replace(part_path, dest_path)
+    else:
+        _transcode(part_path, dest_path)
+        os.remove(part_path)
+    if os.path.exists(part_meta_path):
+        os.remove(part_meta_path)
+
+    _write_meta(meta_path, {
+        "url": url,
+        "etag": part_meta.get("etag"),
+        "last_modified": part_meta.get("last_modified"),
+        "sha256": digest
+    })
+    return dest_path, "downloaded"
+
+
+def download_all(urls, output_dir, max_workers=4, checksums=None, decompress=True, store_compression="none",
+                 session=None):
+    """
+    Downloads urls concurrently over one pooled session.
+
+    checksums optionally maps a URL to its expected sha256. Returns a {url: (path, status)} dict and
+    raises the first error after all other downloads have finished.
+    """
+    checksums = checksums or {}
+    session = session or build_session(pool_size=max_workers)
+    os.makedirs(output_dir, exist_ok=True)
+
+    results = {}
+    errors = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(download_file, session, url, output_dir, checksums.get(url), decompress,
+                               store_compression): url
+                   for url in urls}
+        for future in as_completed(futures):
+            url = futures[future]
+            try:
+                results[url] = future.result()
+                path, status = results[url]
+                print(f"{'Downloaded' if status == 'downloaded' else 'Unchanged, skipped'} {url} -> {path}")
+            except Exception as e:
+                print(f"Failed to download {url}: {e}")
+                errors.append(e)
+
+    if errors:
+        raise errors[0]
+    return results
@@ -0,0 +1,114 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+
+
+def normalize_text(text):
+    """Unicode NFC with whitespace runs collapsed, so trivially different spellings share a cache entry."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+def cache_key(deployment, text):
+    return hashlib.blake2b(f"{deployment}\0{normalize_text(text)}".encode("utf-8"), digest_size=16).digest()
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache in sqlite, keyed by (deployment, normalized text hash).
+
+    Vectors are stored as float32 blobs (6 KB for ada-002). The database runs in WAL mode with one
+    connection per thread, so readers in other threads or processes (the app and an ingest run) never
+    block each other. Once more than max_entries vectors are stored, the least recently used are evicted.
+    hits and misses count lookups made through this instance.
+    """
+
+    def __init__(self, cache_path, max_entries=50000):
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        conn = self._conn()
+        conn.execute("CREATE TABLE IF NOT EXISTS embeddings "
+                     "(key BLOB PRIMARY KEY, deployment TEXT, vector BLOB, last_used REAL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+        conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.cache_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, deployment, texts):
+        """Cached vectors for texts, in order, with None for every miss. Hits are marked as recently used."""
+        keys = [cache_key(deployment, text) for text in texts]
+        conn = self._conn()
+        found = {}
+        # Stay well below sqlite's bound parameter limit
+        for start in range(0, len(keys), 500):
+            batch = keys[start:start + 500]
+            rows = conn.execute(f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                                batch).fetchall()
+            found.update(rows)
+        if found:
+            now = time.time()
+            conn.executemany("UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found])
+            conn.commit()
+
+        vectors = [array('f', found[key]).tolist() if key in found else None for key in keys]
+        with self._lock:
+            hit_count = sum(1 for vector in vectors if vector is not None)
+            self.hits += hit_count
+            self.misses += len(vectors) - hit_count
+        return vectors
+
+    def get(self, deployment, text):
+        return self.get_many(deployment, [text])[0]
+
+    def put_many(self, deployment, texts, vectors):
+        now = time.time()
+        conn = self._conn()
+        conn.executemany("INSERT OR REPLACE INTO embeddings (key, deployment, vector, last_used) VALUES (?, ?, ?, ?)",
+                         [(cache_key(deployment, text), deployment, array('f', vector).tobytes(), now)
+                          for text, vector in zip(texts, vectors)])
+        conn.commit()
+        self._evict(conn)
+
+    def put(self, deployment, text, vector):
+        self.put_many(deployment, [text], [vector])
+
+    def _evict(self, conn):
+        if not self.max_entries:
+            return
+        excess = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0] - self.max_entries
+        if excess > 0:
+            conn.execute("DELETE FROM embeddings WHERE key IN "
+                         "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)", (excess,))
+            conn.commit()
+
+    def stats(self):
+        entries = self._conn().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,60 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.vector_sidecar import get_field, set_field
+
+
+def _embed_batch(batch, vector_field, text_field):
+    """Embeds the records of one batch that have text but no vector. Returns the batch and the number embedded."""
+    # openai is only needed when the stage is actually used
+    from utils.openai_embedder import get_embeddings
+
+    missing = [record for _, _, record in batch
+               if get_field(record, vector_field) is None and get_field(record, text_field)]
+    if missing:
+        vectors = get_embeddings([get_field(record, text_field) for record in missing])
+        for record, vector in zip(missing, vectors):
+            set_field(record, vector_field, vector)
+    return batch, len(missing)
+
+
+def embed_missing_vectors(lines, vector_field, text_field, batch_size=64, concurrency=4):
+    """
+    Pipeline stage that fills in vector_field for records that do not have one yet.
+
+    lines yields (end_offset, line_number, record) tuples like iter_ndjson_lines. Records are grouped into
+    batches of batch_size, which are embedded on concurrency threads; every request goes through the shared
+    rate limiter and embedding cache of utils/openai_embedder.py. Records come out in input order, and at
+    most 2 * concurrency batches are held in memory. Records with a vector or without text pass through.
+    """
+    pending = deque()
+    embedded = 0
+
+    def drain(future):
+        nonlocal embedded
+        batch, count = future.result()
+        embedded += count
+        yield from batch
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        batch = []
+        for line in lines:
+            batch.append(line)
+            if len(batch) >= batch_size:
+                pending.append(pool.submit(_embed_batch, batch, vector_field, text_field))
+                batch = []
+                if len(pending) >= concurrency * 2:
+                    yield from drain(pending.popleft())
+        if batch:
+            pending.append(pool.submit(_embed_batch, batch, vector_field, text_field))
+        while pending:
+            yield from drain(pending.popleft())
+
+    print(f"Embedded {embedded} records that had no {vector_field}.")
+    # Imported here for the same reason as in _embed_batch
+    from utils.openai_embedder import get_embedding_cache
+    cache = get_embedding_cache()
+    if cache:
+        stats = cache.stats()
+        print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate), "
+              f"{stats['entries']} entries.")
@@ -1,14 +1,38 @@
+from utils.es_schema import field, build_mapping
+
 index_name = 'workplace-app-tariffs-bym'
 elser_index_name = 'workplace-app-tariffs-elser'
 ada002_index_name = 'workplace-app-tariffs-summary-ada-002'
 number_of_dims = 768
 similarity = "cosine"
-rate_throttle = .2
 deleteExistingIndex = True
 model='sentence-transformers__all-minilm-l6-v2'
 elser_model=".elser_model_1"
 vector_embedding_field = "vector_query_field.predicted_value"
 elser_embedding_field = "vector.tokens"
+# Projection (from ingest/fit_projection.py) the ada-002 index was loaded with, e.g.
+# "./output/ada002-projection-pca-256.npz". Query vectors are projected with it; None keeps full ada-002 vectors.
+ada002_projection_path = None
+# Print every search request body (query_helper.dump_query)
+debug_queries = False
+# Search result cache (utils/result_cache.py): entries live for search_cache_ttl seconds. search_cache_path adds
+# a sqlite store shared by all app processes, e.g. "./output/search_cache.sqlite"; None keeps it in-process only.
+# The index generation behind each search is re-checked every index_generation_check_interval seconds.
+search_cache_ttl = 600
+search_cache_max_entries = 256
+search_cache_path = None
+index_generation_check_interval = 30
+# Client-side fusion ("Client Fusion"): weights used by weighted_rrf / combsum / combmnz, and the time after
+# which the _msearch is cut off and late retrievers are dropped from the fusion. Retrievers are told to stop
+# fusion_timeout_margin_ms before the deadline, so their partial results make it back in time.
+fusion_weights = {"bm25": 1.0, "minilm_knn": 1.0, "elser": 1.0}
+fusion_deadline_ms = 1500
+fusion_timeout_margin_ms = 250
+# "Vector OpenAI" embeds the query and runs NER concurrently; NER that takes longer is skipped (no location filter)
+pre_search_deadline_ms = 1000
+# Facet counts are fetched by a separate request, only when the facet panel is shown, and cached for facet_cache_ttl
+show_facets = False
+facet_cache_ttl = 300
 
 
 
@@ -46,906 +70,105 @@ settings = {
 }
 
 # Mapping Specification
-byom_mapping =  {
+# Fields are declared once with their role; utils/es_schema.py generates the three mappings from them.
+# Facet roles keep the <field>.keyword paths query_helper.py aggregates and filters on.
+tariff_metadata_fields = {
+    "_run_ml_inference": field("boolean"),
+    "canonical_id": field("keyword", "filter"),
+    "company": field("string", "facet"),
+    "state": field("string", "facet"),
+    "tarrif_category": field("string", "facet"),
+    "tarrif_type": field("string", "facet"),
+    "category": field("string", "filter"),
+    "id": field("string", "filter"),
+    "rolePermissions": field("string", "filter"),
+    "effective_date": field("date", "filter"),
+    "published_date": field("date", "filter"),
+    "superseded_date": field("date", "filter"),
+    "tarrif_active": field("boolean", "filter"),
+    "tarrif_superseded": field("boolean", "filter"),
+    "summary": field("string", "search"),
+    "tarrif_description": field("string", "search"),
+    "tarrif_title": field("string", "search"),
+    "title": field("string", "search"),
+    "file": field("string"),
+    "index": field("string"),
+    "name": field("string"),
+    "size": field("string"),
+    "url": field("string")
+}
+
+# bym and elser chunks carry the document's file properties as well
+document_metadata_fields = {
+    **tariff_metadata_fields,
+    "author": field("string", "facet"),
+    "chunk": field("long", "filter"),
+    "keywords": field("string", "search"),
+    "created_on": field("date"),
+    "modfied_on": field("date"),
+    "updated_at": field("date"),
+    "creator": field("string"),
+    "page_number": field("long"),
+    "producer": field("string"),
+    "source": field("string"),
+    "tokens": field("long")
+}
+
+byom_schema = {
     "properties": {
-        "metadata": {
-            "properties": {
-                "_run_ml_inference": {
-                    "type": "boolean"
-                },
-                "author": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "category": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "chunk": {
-                    "type": "long"
-                },
-                "company": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "created_on": {
-                    "type": "date"
-                },
-                "creator": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "effective_date": {
-                    "type": "date"
-                },
-                "file": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "id": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "index": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "keywords": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "modfied_on": {
-                    "type": "date"
-                },
-                "name": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "page_number": {
-                    "type": "long"
-                },
-                "producer": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "published_date": {
-                    "type": "date"
-                },
-                "rolePermissions": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "size": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "source": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "state": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "summary": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "superseded_date": {
-                    "type": "date"
-                },
-                "tarrif_active": {
-                    "type": "boolean"
-                },
-                "tarrif_category": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "tarrif_description": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "tarrif_superseded": {
-                    "type": "boolean"
-                },
-                "tarrif_title": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "tarrif_type": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "title": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "tokens": {
-                    "type": "long"
-                },
-                "updated_at": {
-                    "type": "date"
-                },
-                "url": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                }
-            }
-        },
-        "text_field": {
-            "type": "text"
-        },
+        "metadata": {"properties": document_metadata_fields},
+        "text_field": field("text", "search"),
         "vector_query_field": {
             "properties": {
-                "is_truncated": {
-                    "type": "boolean"
-                },
-                "model_id": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "predicted_value": {
-                    "type": "dense_vector",
-                    "dims": 384,
-                    "index": "true",
-                    "similarity": "l2_norm"
-                }
+                "is_truncated": field("boolean"),
+                "model_id": field("string"),
+                "predicted_value": field("dense_vector", "search", dims=384, index="true", similarity="l2_norm")
             }
         }
     }
 }
 
-elser_mapping = {
+elser_schema = {
     "properties": {
-        "metadata": {
-            "properties": {
-                "_run_ml_inference": {
-                    "type": "boolean"
-                },
-                "author": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "category": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "chunk": {
-                    "type": "long"
-                },
-                "company": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "created_on": {
-                    "type": "date"
-                },
-                "creator": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "effective_date": {
-                    "type": "date"
-                },
-                "file": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "id": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "index": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "keywords": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "modfied_on": {
-                    "type": "date"
-                },
-                "name": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "page_number": {
-                    "type": "long"
-                },
-                "producer": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "published_date": {
-                    "type": "date"
-                },
-                "rolePermissions": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "size": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "source": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "state": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "summary": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "superseded_date": {
-                    "type": "date"
-                },
-                "tarrif_active": {
-                    "type": "boolean"
-                },
-                "tarrif_category": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "tarrif_description": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "tarrif_superseded": {
-                    "type": "boolean"
-                },
-                "tarrif_title": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "tarrif_type": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "title": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "tokens": {
-                    "type": "long"
-                },
-                "updated_at": {
-                    "type": "date"
-                },
-                "url": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                }
-            }
-        },
-        "text": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
+        "metadata": {"properties": document_metadata_fields},
+        "text": field("string", "search"),
         "vector": {
             "properties": {
-                "model_id": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "tokens": {
-                    "type": "rank_features"
-                }
+                "model_id": field("string"),
+                "tokens": field("rank_features", "search")
             }
         }
     }
 }
 
-ada002_mapping = {
+# The ada-002 export repeats the metadata at the top level. Queries only use metadata.* and the
+# content, so the top-level copies are kept in _source only.
+ada002_schema = {
     "properties": {
-        "_run_ml_inference": {
-            "type": "boolean"
-        },
-        "category": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
-        "company": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
-        "content": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
-        "content_tokens": {
-            "type": "long"
-        },
-        "effective_date": {
-            "type": "date"
-        },
-        "file": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
-        "id": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
-        "index": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
-        "ingested": {
-            "type": "boolean"
-        },
+        **{name: field(spec["type"] if spec["type"] != "keyword" else "string")
+           for name, spec in tariff_metadata_fields.items() if name != "canonical_id"},
+        "content": field("string", "search"),
+        "content_tokens": field("long"),
+        "ingested": field("boolean"),
         "metadata": {
             "properties": {
-                "_run_ml_inference": {
-                    "type": "boolean"
-                },
-                "category": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "company": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "content": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "content_tokens": {
-                    "type": "long"
-                },
-                "effective_date": {
-                    "type": "date"
-                },
-                "file": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "id": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "index": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "ingested": {
-                    "type": "boolean"
-                },
-                "name": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "published_date": {
-                    "type": "date"
-                },
-                "rolePermissions": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "size": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "state": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "summary": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "superseded_date": {
-                    "type": "date"
-                },
-                "tarrif_active": {
-                    "type": "boolean"
-                },
-                "tarrif_category": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "tarrif_description": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "tarrif_superseded": {
-                    "type": "boolean"
-                },
-                "tarrif_title": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "tarrif_type": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "title": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "url": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                }
-            }
-        },
-        "name": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
-        "published_date": {
-            "type": "date"
-        },
-        "rolePermissions": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
-        "size": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
-        "state": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
-        "summary": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
-        "superseded_date": {
-            "type": "date"
-        },
-        "tarrif_active": {
-            "type": "boolean"
-        },
-        "tarrif_category": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
-        "tarrif_description": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
-        "tarrif_superseded": {
-            "type": "boolean"
-        },
-        "tarrif_title": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
-        "tarrif_type": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
-        "title": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
-            }
-        },
-        "url": {
-            "type": "text",
-            "fields": {
-                "keyword": {
-                    "type": "keyword",
-                    "ignore_above": 256
-                }
+                **tariff_metadata_fields,
+                "content": field("string"),
+                "content_tokens": field("long"),
+                "ingested": field("boolean")
             }
         },
         "vector_query_field": {
             "properties": {
-                "is_truncated": {
-                    "type": "boolean"
-                },
-                "model": {
-                    "type": "text",
-                    "fields": {
-                        "keyword": {
-                            "type": "keyword",
-                            "ignore_above": 256
-                        }
-                    }
-                },
-                "predicted_value": {
-                    "type": "dense_vector",
-                    "dims": 1536,
-                    "index": "true",
-                    "similarity": "dot_product"
-                }
+                "is_truncated": field("boolean"),
+                "model": field("string"),
+                "predicted_value": field("dense_vector", "search", dims=1536, index="true",
+                                         similarity="dot_product")
             }
         }
     }
 }
 
+byom_mapping = build_mapping(byom_schema)
+elser_mapping = build_mapping(elser_schema)
+ada002_mapping = build_mapping(ada002_schema)
@@ -1,3 +1,6 @@
+import re
+import time
+
 from elasticsearch import Elasticsearch
 
 
@@ -14,7 +17,8 @@ def manage_index(es: Elasticsearch, index_name: str, settings: dict, mappings: d
     if es.indices.exists(index=index_name):
         if deleteIndex:
             print(f"Index {index_name} exists. Deleting it...")
-            es.indices.delete(index=index_name)
+            # An alias left behind by a rebuild cannot be deleted by name; delete what it points at
+            es.indices.delete(index=get_alias_indices(es, index_name) or index_name)
             print(f"Index {index_name} deleted!")
             es.indices.create(index=index_name, settings=settings, mappings=mappings)
             print(f"Index {index_name} created successfully!")
@@ -25,3 +29,88 @@ def manage_index(es: Elasticsearch, index_name: str, settings: dict, mappings: d
         # Create new index with the specified mappings
         es.indices.create(index=index_name, settings=settings, mappings=mappings)
         print(f"Index {index_name} created successfully!")
+
+
+# Applied while a fresh index generation is being bulk loaded, then reverted by finalize_index_generation
+ingest_optimized_settings = {
+    "refresh_interval": "-1",
+    "number_of_replicas": 0
+}
+
+
+def _is_generation_of(index, alias_name):
+    return re.fullmatch(rf"{re.escape(alias_name)}-\d{{14}}", index) is not None
+
+
+def get_alias_indices(es: Elasticsearch, alias_name: str):
+    """Concrete indices the alias currently points at; empty if it does not exist as an alias."""
+    if not es.indices.exists_alias(name=alias_name):
+        return []
+    return list(es.indices.get_alias(name=alias_name).keys())
+
+
+def find_pending_generation(es: Elasticsearch, alias_name: str):
+    """Newest index generation that was created for the alias but never swapped in, if any."""
+    live = set(get_alias_indices(es, alias_name))
+    generations = [index for index in es.indices.get(index=f"{alias_name}-*", expand_wildcards="open")
+                   if _is_generation_of(index, alias_name) and index not in live]
+    return max(generations) if generations else None
+
+
+def create_index_generation(es: Elasticsearch, alias_name: str, settings: dict, mappings: dict):
+    """
+    Creates a new, versioned index for a zero-downtime rebuild of alias_name.
+
+    The generation is created without replicas and with refresh disabled, which is much cheaper to
+    bulk load. Searches keep hitting the current generation until finalize_index_generation runs.
+    """
+    generation = f"{alias_name}-{time.strftime('%Y%m%d%H%M%S', time.gmtime())}"
+    es.indices.create(index=generation, settings={**settings, **ingest_optimized_settings}, mappings=mappings)
+    print(f"Index generation {generation} created for {alias_name}.")
+    return generation
+
+
+def finalize_index_generation(es: Elasticsearch, alias_name: str, generation: str, settings: dict,
+                              force_merge: bool = False, max_num_segments: int = 1, delete_old: bool = True):
+    """
+    Makes a freshly loaded generation live.
+
+    Restores the regular refresh interval and replica count, optionally force-merges, then moves the
+    alias in one atomic update. If the generation does not reach yellow health, a RuntimeError is raised
+    and the alias is left where it was. A legacy concrete index that still carries the alias name is removed in
+    the same update. Previous generations are deleted unless delete_old is False.
+    """
+    es.indices.put_settings(index=generation, settings={
+        "index": {
+            "refresh_interval": settings.get("refresh_interval"),
+            "number_of_replicas": settings.get("number_of_replicas", 1)
+        }
+    })
+    es.indices.refresh(index=generation)
+
+    if force_merge:
+        print(f"Force merging {generation} to {max_num_segments} segment(s)...")
+        es.indices.forcemerge(index=generation, max_num_segments=max_num_segments, request_timeout=3600)
+
+    # Replicas are allocated in the background; make sure primaries are searchable before swapping
+    health = es.cluster.health(index=generation, wait_for_status="yellow", timeout="5m")
+    if health.get("timed_out") or health.get("status") not in ("yellow", "green"):
+        raise RuntimeError(f"{generation} did not reach yellow health (status {health.get('status')}, timed out "
+                           f"{health.get('timed_out')}). {alias_name} was not moved; the previous generation is "
+                           f"still live.")
+
+    old_indices = [index for index in get_alias_indices(es, alias_name) if index != generation]
+    actions = [{"remove": {"index": index, "alias": alias_name}} for index in old_indices]
+    if not old_indices and es.indices.exists(index=alias_name):
+        # First rebuild after the unversioned layout: swap the concrete index out atomically
+        actions.append({"remove_index": {"index": alias_name}})
+    actions.append({"add": {"index": generation, "alias": alias_name}})
+    es.indices.update_aliases(actions=actions)
+    print(f"Alias {alias_name} now points at {generation}.")
+
+    if delete_old:
+        for index in old_indices:
+            es.indices.delete(index=index)
+            print(f"Previous generation {index} deleted.")
+
+    return old_indices
@@ -0,0 +1,144 @@
+import copy
+
+# How a field is used, which decides what Elasticsearch has to build for it:
+# - search: full-text matched and scored (analyzed text with norms)
+# - facet: aggregated and filtered through its .keyword sub-field, the way query_helper.py does
+# - filter: exact-value filters and sorting only (keyword / numeric with doc values, no text)
+# - stored: only returned in _source, nothing is indexed
+field_roles = ("search", "facet", "filter", "stored")
+
+# Every string field of the original hand-written mappings looked like this
+_legacy_string = {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}}
+
+
+def field(field_type, role="stored", **options):
+    """
+    Declares one field of a schema.
+
+    field_type is an Elasticsearch type, or "string" for free-form strings whose mapping follows from the
+    role. options (e.g. dims / similarity of a dense_vector) are copied into the mapping as they are.
+    """
+    if role not in field_roles:
+        raise ValueError(f"Invalid field role: {role}. Expected one of {', '.join(field_roles)}")
+    return {"type": field_type, "role": role, "options": options}
+
+
+def _string_mapping(role):
+    if role == "search":
+        return {"type": "text"}
+    if role == "facet":
+        # Scoring never looks at these, so norms are dropped; the keyword sub-field keeps the facet paths
+        return {"type": "text", "norms": False, "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}}
+    if role == "filter":
+        return {"type": "keyword", "ignore_above": 256}
+    return {"type": "keyword", "index": False, "doc_values": False}
+
+
+def _field_mapping(spec, lean):
+    field_type, role = spec["type"], spec["role"]
+    if field_type == "string":
+        mapping = _string_mapping(role) if lean else copy.deepcopy(_legacy_string)
+    else:
+        mapping = {"type": field_type}
+        if lean and role == "stored" and field_type in ("long", "date", "boolean", "keyword"):
+            mapping.update({"index": False, "doc_values": False})
+    mapping.update(spec["options"])
+    return mapping
+
+
+def build_mapping(schema, lean=True):
+    """
+    Generates an index mapping from a schema of field() declarations, nested with {"properties": {...}}.
+
+    With lean=False every string becomes text plus a keyword sub-field, which reproduces the original
+    hand-written mappings; estimate_mapping_savings compares the two.
+    """
+    properties = {}
+    for name, spec in schema["properties"].items():
+        if "properties" in spec:
+            properties[name] = build_mapping(spec, lean)
+        else:
+            properties[name] = _field_mapping(spec, lean)
+    return {"properties": properties}
+
+
+def iter_schema_fields(schema, prefix=""):
+    """Yields (dotted_path, field declaration) for every field of a schema."""
+    for name, spec in schema["properties"].items():
+        if "properties" in spec:
+            yield from iter_schema_fields(spec, f"{prefix}{name}.")
+        else:
+            yield f"{prefix}{name}", spec
+
+
+def _mapped_bytes(mapping, value):
+    """
+    Very rough per-document index cost of one field value, in bytes, excluding _source.
+
+    Analyzed text costs postings plus a norm, keywords terms plus doc values, numbers points plus doc values.
+    It is meant for comparing mappings of the same data, not for capacity planning.
+    """
+    if value is None or mapping.get("type") in ("dense_vector", "rank_features"):
+        return 0.0
+    text = value if isinstance(value, str) else str(value)
+    size = 0.0
+    field_type = mapping["type"]
+    indexed = mapping.get("index", True)
+    doc_values = mapping.get("doc_values", True)
+    if field_type == "text":
+        size += 0.4 * len(text) + (1 if mapping.get("norms", True) else 0)
+    elif field_type == "keyword":
+        if len(text) <= mapping.get("ignore_above", 1 << 30):
+            size += (0.5 * len(text) + 2 if indexed else 0) + (0.5 * len(text) + 2 if doc_values else 0)
+    elif field_type in ("long", "date"):
+        size += (8 if indexed else 0) + (8 if doc_values else 0)
+    elif field_type == "boolean":
+        size += (1 if indexed else 0) + (1 if doc_values else 0)
+    for sub_mapping in mapping.get("fields", {}).values():
+        size += _mapped_bytes(sub_mapping, value)
+    return size
+
+
+def estimate_mapping_savings(schema, records):
+    """
+    Estimates the index size of the lean and the legacy mapping of schema over sample records.
+
+    Returns:
+    - A dictionary with the estimated legacy and lean bytes and a per-field breakdown, largest saving first.
+    """
+    legacy = build_mapping(schema, lean=False)
+    lean = build_mapping(schema, lean=True)
+    paths = [path for path, _ in iter_schema_fields(schema)]
+    totals = {path: [0.0, 0.0] for path in paths}
+
+    def lookup(mapping, path):
+        for key in path.split("."):
+            mapping = mapping["properties"][key]
+        return mapping
+
+    def value_of(record, path):
+        for key in path.split("."):
+            if not isinstance(record, dict):
+                return None
+            record = record.get(key)
+        return record
+
+    count = 0
+    for record in records:
+        count += 1
+        for path in paths:
+            value = value_of(record, path)
+            totals[path][0] += _mapped_bytes(lookup(legacy, path), value)
+            totals[path][1] += _mapped_bytes(lookup(lean, path), value)
+
+    legacy_bytes = sum(legacy_size for legacy_size, _ in totals.values())
+    lean_bytes = sum(lean_size for _, lean_size in totals.values())
+    return {
+        "records": count,
+        "legacy_bytes": legacy_bytes,
+        "lean_bytes": lean_bytes,
+        "saved_fraction": 1 - lean_bytes / legacy_bytes if legacy_bytes else 0.0,
+        "fields": sorted(({"field": path, "legacy_bytes": sizes[0], "lean_bytes": sizes[1]}
+                          for path, sizes in totals.items()),
+                         key=lambda row: row["lean_bytes"] - row["legacy_bytes"])
+    }
@@ -0,0 +1,105 @@
+import time
+
+from elasticsearch import ConnectionTimeout
+
+fusion_methods = ("rrf", "weighted_rrf", "combsum", "combmnz")
+
+
+def normalize_scores(hits):
+    """Min-max normalized _score of each hit, in order; a list of equal scores normalizes to 1.0."""
+    scores = [hit.get("_score") or 0.0 for hit in hits]
+    if not scores:
+        return []
+    low, high = min(scores), max(scores)
+    if high == low:
+        return [1.0] * len(scores)
+    return [(score - low) / (high - low) for score in scores]
+
+
+def fuse(ranked_hits, method="rrf", weights=None, rank_constant=60, size=10):
+    """
+    Fuses the ranked hit lists of several retrievers into one ranking.
+
+    ranked_hits maps a retriever name to its hits, best first. Documents are matched on _id.
+    - rrf: sum of 1 / (rank_constant + rank)
+    - weighted_rrf: the same, with each retriever's term multiplied by its weight
+    - combsum: sum of the weighted, min-max normalized scores
+    - combmnz: combsum multiplied by the number of retrievers that returned the document
+    Retrievers missing from weights weigh 1.0.
+    Returns:
+    - The size best hits, each a copy of the first hit seen for the document with _score set to the fused
+      score and _retrievers holding the document's 1-based rank per retriever.
+    """
+    if method not in fusion_methods:
+        raise ValueError(f"Invalid fusion method: {method}. Expected one of {', '.join(fusion_methods)}")
+    weights = weights or {}
+    fused = {}
+    for name, hits in ranked_hits.items():
+        weight = weights.get(name, 1.0) if method != "rrf" else 1.0
+        normalized = normalize_scores(hits) if method in ("combsum", "combmnz") else None
+        for rank, hit in enumerate(hits, start=1):
+            entry = fused.get(hit["_id"])
+            if entry is None:
+                entry = fused[hit["_id"]] = {**hit, "_score": 0.0, "_retrievers": {}}
+            if normalized is None:
+                entry["_score"] += weight / (rank_constant + rank)
+            else:
+                entry["_score"] += weight * normalized[rank - 1]
+            entry["_retrievers"][name] = rank
+
+    if method == "combmnz":
+        for entry in fused.values():
+            entry["_score"] *= len(entry["_retrievers"])
+    return sorted(fused.values(), key=lambda entry: entry["_score"], reverse=True)[:size]
+
+
+def multi_search(es, retrievers, deadline_ms=None, filter_path=None):
+    """
+    Runs the retrievers as one _msearch and reports how each of them did.
+
+    retrievers is a list of (name, index, body) with body a dictionary or pre-serialized JSON bytes. With
+    deadline_ms, the round trip is cut off at the deadline and a retriever that timed out, took longer than
+    the deadline or failed is dropped. Retrievers may return partial results, and bodies should carry a
+    "timeout" somewhat below the deadline so Elasticsearch stops working on them in time to answer; when
+    the whole _msearch misses the deadline, every retriever is dropped. filter_path trims the responses; it
+    has to keep responses.took, responses.error and the hits.
+    Returns:
+    - A (hits, report) tuple: hits maps every retriever that made it to its hits, and report maps every
+      retriever to its index, server-side took_ms, hit count, error and whether it was dropped. The
+      whole round trip is reported as "_msearch".
+    """
+    searches = []
+    for _, index, body in retrievers:
+        searches.append({"index": index, "allow_partial_search_results": True} if deadline_ms else {"index": index})
+        searches.append(body)
+    if deadline_ms:
+        # A retry would only start after the deadline has passed
+        es = es.options(request_timeout=deadline_ms / 1000, max_retries=0)
+    started = time.perf_counter()
+    try:
+        responses = es.msearch(searches=searches, filter_path=filter_path)["responses"]
+    except ConnectionTimeout:
+        if not deadline_ms:
+            raise
+        responses = [{"error": f"no response within {deadline_ms} ms", "timed_out": True}] * len(retrievers)
+    round_trip_ms = (time.perf_counter() - started) * 1000
+
+    hits = {}
+    report = {"_msearch": {"took_ms": round_trip_ms}}
+    for (name, index, _), response in zip(retrievers, responses):
+        error = response.get("error")
+        took = response.get("took")
+        timed_out = response.get("timed_out", False)
+        dropped = error is not None or (deadline_ms is not None and (timed_out or (took or 0) > deadline_ms))
+        report[name] = {
+            "index": index,
+            "took_ms": took,
+            "hits": len(response.get("hits", {}).get("hits", [])),
+            "timed_out": timed_out,
+            "error": (error.get("reason") or error.get("type")) if isinstance(error, dict) else error,
+            "dropped": dropped
+        }
+        if not dropped:
+            # filter_path leaves out "hits" altogether when a retriever found nothing
+            hits[name] = response.get("hits", {}).get("hits", [])
+    return hits, report
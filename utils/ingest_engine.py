@@ -0,0 +1,396 @@
+from collections import deque
+from functools import partial
+
+from elasticsearch import helpers
+
+from utils.es_config import index_name, elser_index_name, ada002_index_name, settings, byom_mapping, \
+    elser_mapping, ada002_mapping, deleteExistingIndex, vector_embedding_field
+from utils.bulk_utils import adaptive_bulk
+from utils.checkpoint_utils import IngestCheckpoint
+from utils.dedup_utils import dedup_records
+from utils.embedding_stage import embed_missing_vectors
+from utils.es_helper import manage_index, create_index_generation, finalize_index_generation, \
+    find_pending_generation
+from utils.mapping_utils import with_vector_index_options, with_vector_dims
+from utils.manifest_utils import IngestManifest, content_hash, default_manifest_path, document_id
+from utils.projection_utils import load_projection, project_vectors
+from utils.ndjson_utils import iter_ndjson_lines, parallel_iter_ndjson_lines, dumps, resolve_ndjson_path
+from utils.vector_sidecar import has_sidecar, open_sidecar, set_field
+
+# One entry per index we rebuild. file_paths are relative to the ingest/ directory,
+# same as the original per-index scripts.
+ingest_profiles = {
+    "bym": {
+        "index_name": index_name,
+        "mapping": byom_mapping,
+        "file_paths": ["../output/workplace-app-tariffs-bym.json"],
+        "text_field": "text_field"
+    },
+    "elser": {
+        "index_name": elser_index_name,
+        "mapping": elser_mapping,
+        "file_paths": ["../output/workplace-app-tariffs-elser.json"],
+        "text_field": "text"
+    },
+    "ada002": {
+        "index_name": ada002_index_name,
+        "mapping": ada002_mapping,
+        "file_paths": ["../output/workplace-app-tariffs-summary-ada-002.json"],
+        "text_field": "content",
+        # Records without a vector can be embedded at ingest time from this text field
+        "embedding": {"vector_field": vector_embedding_field, "text_field": "content"}
+    }
+}
+
+default_thread_count = 2
+default_chunk_size = 500
+default_max_chunk_bytes = 100 * 1024 * 1024
+default_queue_size = 4
+
+
+def get_profile(profile):
+    if profile not in ingest_profiles:
+        raise ValueError(f"Invalid ingest profile: {profile}. Expected one of {', '.join(ingest_profiles)}")
+    return ingest_profiles[profile]
+
+
+def identify_record(record, vector_sidecar=None):
+    """
+    Returns the (_id, source bytes) of one decoded record, attaching its vector from the sidecar of the NDJSON
+    file vector_sidecar when one is given.
+
+    The _id is taken before the vector is attached, the way the sidecar is keyed. Both the actions and the
+    manifest's content hashes build on this, so neither depends on the record stages that run afterwards.
+    """
+    if vector_sidecar:
+        sidecar = open_sidecar(vector_sidecar)
+        doc_id = document_id(record, dumps(record))
+        vector = sidecar.get(doc_id)
+        if vector is not None:
+            set_field(record, sidecar.field, vector)
+        return doc_id, dumps(record)
+    source = dumps(record)
+    return document_id(record, source), source
+
+
+def build_action(record, target_index, vector_sidecar=None):
+    """
+    Turns one decoded record into a bulk action with a deterministic _id.
+
+    When vector_sidecar names an NDJSON file with a vector sidecar, the document's vector is attached
+    from the memory-mapped matrix. The source is re-encoded to bytes up front so the bulk helper
+    forwards it as-is instead of running it through the (much slower) stdlib serializer again.
+    Module level so parse workers can pickle it.
+    """
+    doc_id, source = identify_record(record, vector_sidecar)
+    return {
+        "_index": target_index,
+        "_id": doc_id,
+        "_source": source
+    }
+
+
+def _identify_records(lines, vector_sidecar, manifest, incremental, identified):
+    """
+    Record stage that identifies and hashes every decoded record before the other stages change it.
+
+    The (line_number, _id, content_hash) of each record is appended to identified; the hash is None without
+    a manifest. With incremental, records the manifest already holds with the same hash are dropped here.
+    """
+    for end_offset, line_number, record in lines:
+        doc_id, source = identify_record(record, vector_sidecar)
+        digest = content_hash(source) if manifest else None
+        if incremental and manifest.is_unchanged(doc_id, digest):
+            continue
+        identified.append((line_number, doc_id, digest))
+        yield end_offset, line_number, record
+
+
+def generate_actions(file_path, target_index, decoder="auto", start_offset=0, start_line=0, positions=None,
+                     parse_workers=1, manifest=None, incremental=False, vector_sidecar=None, record_stages=None):
+    """
+    Streams bulk actions from an NDJSON file, starting at a byte offset.
+
+    With parse_workers > 1, decoding and action building run in a process pool and actions still come
+    out in file order. When positions is given, the (end_offset, line_number, _id, content_hash) of every
+    yielded action is appended to it. With incremental, documents the manifest already holds with the
+    same content hash are not sent at all. vector_sidecar is passed on to build_action.
+    record_stages (e.g. dedup_records, embed_missing_vectors) are applied in order to the stream of decoded
+    (end_offset, line_number, record) tuples before the records become actions. Either way the _id and the
+    content hash come from the input record (see identify_record), so toggling a stage between incremental
+    runs does not re-send unchanged documents; they skip the stages, and dedup only compares the changed
+    records.
+    """
+    build = partial(build_action, target_index=target_index, vector_sidecar=vector_sidecar)
+    # With record stages the workers only decode; actions are built once the stages are done
+    parse_build = None if record_stages else build
+    if parse_workers > 1:
+        lines = parallel_iter_ndjson_lines(file_path, parse_workers, start_offset, start_line, decoder,
+                                           parse_build)
+    else:
+        lines = iter_ndjson_lines(file_path, start_offset, start_line, decoder)
+        if parse_build:
+            lines = ((end_offset, line_number, parse_build(record)) for end_offset, line_number, record in lines)
+
+    identified = None
+    if record_stages:
+        # Also attaches sidecar vectors, which must be in place before a stage decides what is missing
+        identified = deque()
+        lines = _identify_records(lines, vector_sidecar, manifest, incremental, identified)
+        for stage in record_stages:
+            lines = stage(lines)
+        lines = ((end_offset, line_number, build_action(record, target_index)) for end_offset, line_number, record
+                 in lines)
+
+    for end_offset, line_number, action in lines:
+        if identified is not None:
+            # Stages keep the input order but may drop records
+            while identified[0][0] != line_number:
+                identified.popleft()
+            _, action["_id"], digest = identified.popleft()
+        else:
+            digest = content_hash(action["_source"]) if manifest else None
+            if incremental and manifest.is_unchanged(action["_id"], digest):
+                continue
+        if positions is not None:
+            positions.append((end_offset, line_number, action["_id"], digest))
+        yield action
+
+
+def bulk_results(es, actions, thread_count=default_thread_count, chunk_size=default_chunk_size,
+                 max_chunk_bytes=default_max_chunk_bytes, queue_size=default_queue_size, adaptive=False,
+                 max_thread_count=None):
+    """
+    Sends actions with parallel_bulk, or with the adaptive indexer when adaptive is set.
+
+    With adaptive, requests are sized by bytes (capped by max_chunk_bytes) and concurrency moves between
+    1 and max_thread_count starting from thread_count; chunk_size and queue_size are then unused.
+    Both paths yield one (success, info) per action in input order.
+    """
+    if adaptive:
+        return adaptive_bulk(es, actions, concurrency=thread_count,
+                             max_concurrency=max_thread_count or thread_count * 4, max_bytes=max_chunk_bytes)
+    return helpers.parallel_bulk(es, actions, thread_count=thread_count, chunk_size=chunk_size,
+                                 max_chunk_bytes=max_chunk_bytes, queue_size=queue_size, raise_on_error=False)
+
+
+def ingest_file(es, file_path, target_index, decoder="auto", checkpoint=None, parse_workers=1, manifest=None,
+                incremental=False, record_stages=None, **bulk_kwargs):
+    """
+    Bulk loads one NDJSON file, resuming from and advancing checkpoint when one is given.
+
+    Results arrive in input order, so every result acknowledges the oldest outstanding position and
+    the checkpoint only ever covers a contiguous acknowledged prefix. It stops advancing at the first
+    failed document, so resuming the file retries it and everything after it. Acknowledged documents are
+    recorded in manifest. Vectors are read from the file's sidecar when it has one, and record_stages
+    are passed on to generate_actions. bulk_kwargs are passed on to bulk_results.
+    """
+    success_count = 0
+    failed_count = 0
+    start_offset, start_line = checkpoint.load() if checkpoint else (0, 0)
+    positions = deque()
+    checkpoint_held = False
+    vector_sidecar = file_path if has_sidecar(file_path) else None
+
+    if vector_sidecar:
+        print(f"Reading vectors for {file_path} from its sidecar.")
+    if start_offset:
+        print(f"Resuming {file_path} at byte {start_offset} (line {start_line})...")
+    else:
+        print(f"Indexing documents from {file_path}...")
+    try:
+        actions = generate_actions(file_path, target_index, decoder, start_offset, start_line, positions,
+                                   parse_workers, manifest, incremental, vector_sidecar, record_stages)
+        for success, info in bulk_results(es, actions, **bulk_kwargs):
+            end_offset, line_number, doc_id, digest = positions.popleft()
+            if success:
+                success_count += 1
+                if manifest:
+                    manifest.record(doc_id, digest)
+            else:
+                print("A document failed:", info)
+                failed_count += 1
+                if manifest:
+                    manifest.mark_seen(doc_id)
+                if checkpoint and not checkpoint_held:
+                    print(f"Checkpoint of {file_path} held before line {line_number} so a resume retries it.")
+                    checkpoint_held = True
+            if checkpoint and not checkpoint_held:
+                checkpoint.mark(end_offset, line_number)
+    except helpers.BulkIndexError as e:
+        print(e)
+        for error_detail in e.errors:
+            print(error_detail)
+    finally:
+        if manifest:
+            manifest.commit()
+        if checkpoint:
+            checkpoint.save()
+
+    print(f"Successfully indexed {success_count} documents.")
+    print(f"Failed to index {failed_count} documents.")
+
+    return success_count, failed_count
+
+
+def delete_stale_documents(es, target_index, manifest, **bulk_kwargs):
+    """Deletes documents the manifest holds from earlier runs that the current run did not see."""
+    stale_ids = manifest.stale_ids()
+    if not stale_ids:
+        return 0
+
+    print(f"Deleting {len(stale_ids)} documents no longer present in the source...")
+    actions = ({"_op_type": "delete", "_index": target_index, "_id": doc_id} for doc_id in stale_ids)
+    deleted = 0
+    for doc_id, (success, info) in zip(stale_ids, bulk_results(es, actions, **bulk_kwargs)):
+        # A 404 means the document is already gone, which is what we wanted
+        if success or info.get("delete", {}).get("status") == 404:
+            manifest.forget(doc_id)
+            deleted += 1
+        else:
+            print("A delete failed:", info)
+    manifest.commit()
+
+    return deleted
+
+
+def build_record_stages(config, file_path, dedup=None, dedup_threshold=0.85, embed_missing=False,
+                        embed_batch_size=64, embed_concurrency=4, projection_path=None):
+    """The record stages run_ingest applies to one file of an ingest profile."""
+    record_stages = []
+    if dedup:
+        # Before embedding, so duplicates that are dropped are never embedded
+        record_stages.append(partial(dedup_records, text_field=config["text_field"], mode=dedup,
+                                     threshold=dedup_threshold, report_path=f"{file_path}.dedup.json"))
+    if embed_missing:
+        record_stages.append(partial(embed_missing_vectors, vector_field=config["embedding"]["vector_field"],
+                                     text_field=config["embedding"]["text_field"], batch_size=embed_batch_size,
+                                     concurrency=embed_concurrency))
+    if projection_path:
+        # Last, so freshly embedded vectors are projected as well
+        record_stages.append(partial(project_vectors, vector_field=config["embedding"]["vector_field"],
+                                     projection_path=projection_path))
+    return record_stages
+
+
+def run_ingest(es, profile, file_paths=None, decoder="auto", delete_existing=deleteExistingIndex, resume=True,
+               checkpoint_every=5000, parse_workers=1, incremental=False, manifest_path=None, rebuild=False,
+               force_merge=False, embed_missing=False, embed_batch_size=64, embed_concurrency=4, dedup=None,
+               dedup_threshold=0.85, vector_index_type=None, vector_confidence_interval=None, projection_path=None,
+               **bulk_kwargs):
+    """
+    Creates the index for an ingest profile (bym, elser or ada002) and bulk loads its NDJSON files.
+
+    With resume enabled, each file keeps a byte-offset checkpoint next to it. A restarted run
+    continues from the last acknowledged document and never deletes the partially loaded index.
+    parse_workers > 1 moves NDJSON decoding off the main thread into that many processes.
+    Documents get deterministic ids and are tracked in a local manifest of content hashes; with
+    incremental, the existing index is kept, only new or changed documents are sent and documents
+    that disappeared from the source are deleted. With rebuild, the profile's index name is served by an
+    alias: the files are loaded into a new versioned index with ingest-optimized settings, which is
+    swapped in atomically at the end (see finalize_index_generation). With embed_missing, records of a
+    profile that declares an embedding field and have no vector yet are embedded on the way in, in
+    batches of embed_batch_size on embed_concurrency threads. dedup ("drop" or "mark") removes or flags
+    near-duplicate chunks of the profile's text field (see dedup_records) and writes a <file>.dedup.json
+    report per file. vector_index_type (e.g. int8_hnsw) sets quantized dense_vector index_options on a
+    newly created index (see with_vector_index_options). projection_path names a projection saved by
+    ingest/fit_projection.py; vectors are reduced with it on the way in and the index is created with the
+    reduced dims. bulk_kwargs tune bulk_results.
+
+    Returns:
+    - A (success_count, failed_count) tuple summed over all files.
+    """
+    config = get_profile(profile)
+    alias_name = config["index_name"]
+    mapping = config["mapping"]
+    if projection_path:
+        if "embedding" not in config:
+            raise ValueError(f"Ingest profile {profile} has no vector field to project")
+        mapping = with_vector_dims(mapping, load_projection(projection_path)["dims"])
+    mapping = with_vector_index_options(mapping, vector_index_type, confidence_interval=vector_confidence_interval)
+    # Plain, .gz and .zst inputs are all streamed; a profile default also matches its compressed copy
+    file_paths = [resolve_ndjson_path(file_path) for file_path in file_paths or config["file_paths"]]
+
+    if embed_missing and "embedding" not in config:
+        raise ValueError(f"Ingest profile {profile} has no embedding field to fill in")
+
+    target_index = alias_name
+    if rebuild:
+        # Resume into a generation that was never swapped in, as long as a checkpoint still points at it
+        pending = find_pending_generation(es, alias_name) if resume else None
+        if pending and any(IngestCheckpoint(file_path, pending).load()[0] for file_path in file_paths):
+            print(f"Resuming rebuild of {alias_name} into {pending}.")
+            target_index = pending
+        elif pending:
+            print(f"Deleting abandoned generation {pending}.")
+            es.indices.delete(index=pending)
+        incremental = False
+        delete_existing = False
+
+    checkpoints = {}
+    for file_path in file_paths:
+        checkpoint = IngestCheckpoint(file_path, target_index, save_every_docs=checkpoint_every)
+        if not resume:
+            checkpoint.clear()
+        checkpoints[file_path] = checkpoint
+
+    if incremental:
+        delete_existing = False
+    if delete_existing and any(checkpoint.load()[0] for checkpoint in checkpoints.values()):
+        print(f"Found ingest checkpoints for {target_index}. Keeping the existing index to resume into it.")
+        delete_existing = False
+
+    manifest = IngestManifest(manifest_path or default_manifest_path(file_paths[0], alias_name))
+    if rebuild and target_index == alias_name:
+        ##create a new index generation behind the alias
+        target_index = create_index_generation(es, alias_name, settings, mapping)
+        for checkpoint in checkpoints.values():
+            checkpoint.target_index = target_index
+        manifest.reset()
+    else:
+        # A recreated index starts empty, so nothing in the manifest is indexed anymore
+        if delete_existing or not es.indices.exists(index=target_index):
+            manifest.reset()
+        ##create index
+        manage_index(es, target_index, settings, mapping, delete_existing)
+    manifest.begin_run(resume)
+
+    total_success = 0
+    total_failed = 0
+    failed_files = []
+    try:
+        for file_path in file_paths:
+            success_count, failed_count = ingest_file(es, file_path, target_index, decoder=decoder,
+                                                      checkpoint=checkpoints[file_path],
+                                                      parse_workers=parse_workers, manifest=manifest,
+                                                      incremental=incremental,
+                                                      record_stages=build_record_stages(
+                                                          config, file_path, dedup, dedup_threshold,
+                                                          embed_missing, embed_batch_size, embed_concurrency,
+                                                          projection_path),
+                                                      **bulk_kwargs)
+            total_success += success_count
+            total_failed += failed_count
+            if failed_count:
+                failed_files.append(file_path)
+
+        if incremental:
+            delete_stale_documents(es, target_index, manifest, **bulk_kwargs)
+        if rebuild:
+            finalize_index_generation(es, alias_name, target_index, settings, force_merge=force_merge)
+        # A run with failures stays open, so resuming it does not turn its documents stale
+        if not failed_files:
+            manifest.finish_run()
+    finally:
+        manifest.close()
+
+    # Every file was read to the end, so the next run starts from scratch. Until then a finished
+    # file keeps its end-of-file checkpoint and is skipped when a later file's ingest is resumed.
+    # Files with failed documents keep their checkpoint, so re-running resumes at the first failure.
+    for file_path, checkpoint in checkpoints.items():
+        if file_path in failed_files:
+            print(f"{file_path} had failed documents. Re-run the same command to retry them.")
+        else:
+            checkpoint.clear()
+
+    return total_success, total_failed
@@ -0,0 +1,142 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+
+def content_hash(source_bytes):
+    """Short, stable digest of a serialized document source."""
+    return hashlib.blake2b(source_bytes, digest_size=16).hexdigest()
+
+
+def document_id(record, source_bytes=None):
+    """
+    Deterministic _id for a tariff chunk.
+
+    Built from metadata.id and metadata.chunk (or their top-level equivalents in the ada-002 export)
+    so a changed chunk overwrites its previous version in place. Records without a chunk number, like
+    the ada-002 export, can share an id, so the content hash of their source takes the chunk's place;
+    records without an id fall back to the content hash alone.
+    """
+    metadata = record.get("metadata") or {}
+    doc_key = metadata.get("id", record.get("id"))
+    chunk = metadata.get("chunk", record.get("chunk"))
+    if doc_key is not None and chunk is not None:
+        return f"{doc_key}:{chunk}"
+    if source_bytes is None:
+        raise ValueError("Record has no metadata.id and metadata.chunk and no source to hash")
+    if doc_key is not None:
+        return f"{doc_key}:{content_hash(source_bytes)}"
+    return content_hash(source_bytes)
+
+
+def default_manifest_path(file_path, target_index):
+    return os.path.join(os.path.dirname(os.path.abspath(file_path)), f"{target_index}.manifest.sqlite")
+
+
+class IngestManifest:
+    """
+    Local record of which document ids and content hashes are currently indexed.
+
+    Every ingest run gets a run id. Documents seen in a run are stamped with it, so after the last
+    file anything still carrying an older run id is gone from the source and can be deleted.
+    An interrupted run keeps its run id, so resuming it does not turn earlier documents stale.
+    """
+
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        # The bulk helpers read actions on a worker thread and report results on the caller's thread
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(manifest_path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS docs (doc_id TEXT PRIMARY KEY, hash TEXT, run INTEGER)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS docs_run ON docs (run)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+        self._conn.commit()
+        self._pending = 0
+        self.run_id = None
+
+    def _meta(self, key, default=0):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def begin_run(self, resume=True):
+        """Starts a new run, or continues the previous one if it never finished and resume is set."""
+        with self._lock:
+            last_run = self._meta("run")
+            if resume and last_run and not self._meta("run_complete", 1):
+                self.run_id = last_run
+            else:
+                self.run_id = last_run + 1
+                self._set_meta("run", self.run_id)
+                self._set_meta("run_complete", 0)
+            self._conn.commit()
+        return self.run_id
+
+    def reset(self):
+        """Forgets every document, e.g. after the index itself was recreated."""
+        with self._lock:
+            self._conn.execute("DELETE FROM docs")
+            self._conn.commit()
+
+    def is_unchanged(self, doc_id, digest):
+        """True when doc_id is already indexed with this content; the document is then marked as seen."""
+        with self._lock:
+            row = self._conn.execute("SELECT hash FROM docs WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is None or row[0] != digest:
+                return False
+            self._conn.execute("UPDATE docs SET run = ? WHERE doc_id = ?", (self.run_id, doc_id))
+            self._maybe_commit()
+            return True
+
+    def record(self, doc_id, digest):
+        """Records an acknowledged index operation."""
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO docs (doc_id, hash, run) VALUES (?, ?, ?)",
+                               (doc_id, digest, self.run_id))
+            self._maybe_commit()
+
+    def mark_seen(self, doc_id):
+        """
+        Stamps doc_id with the current run without touching its hash, e.g. after a failed update. The
+        previous version is still indexed, so it must not turn stale; the old hash makes the next
+        incremental run send the update again.
+        """
+        with self._lock:
+            self._conn.execute("UPDATE docs SET run = ? WHERE doc_id = ?", (self.run_id, doc_id))
+            self._maybe_commit()
+
+    def forget(self, doc_id):
+        """Records an acknowledged delete."""
+        with self._lock:
+            self._conn.execute("DELETE FROM docs WHERE doc_id = ?", (doc_id,))
+            self._maybe_commit()
+
+    def stale_ids(self):
+        """Ids indexed by an earlier run but not seen in the current one."""
+        with self._lock:
+            rows = self._conn.execute("SELECT doc_id FROM docs WHERE run < ?", (self.run_id,)).fetchall()
+        return [row[0] for row in rows]
+
+    def finish_run(self):
+        with self._lock:
+            self._set_meta("run_complete", 1)
+            self._conn.commit()
+            self._pending = 0
+
+    def _maybe_commit(self):
+        self._pending += 1
+        if self._pending >= 1000:
+            self._conn.commit()
+            self._pending = 0
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._conn.close()
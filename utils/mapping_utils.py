@@ -0,0 +1,53 @@
+import copy
+
+# Vector index layouts supported by dense_vector index_options. int8_hnsw (Elasticsearch 8.12+) stores a
+# 1 byte per dimension copy of every vector in the HNSW graph, int4_hnsw (8.15+) half a byte.
+vector_index_types = ("hnsw", "int8_hnsw", "int4_hnsw")
+
+
+def iter_dense_vector_fields(mapping, prefix=""):
+    """Yields (dotted_path, field_mapping) for every dense_vector field of a mapping."""
+    for name, spec in mapping.get("properties", {}).items():
+        path = f"{prefix}{name}"
+        if spec.get("type") == "dense_vector":
+            yield path, spec
+        elif "properties" in spec:
+            yield from iter_dense_vector_fields(spec, f"{path}.")
+
+
+def with_vector_index_options(mapping, index_type=None, m=None, ef_construction=None, confidence_interval=None):
+    """
+    Copy of mapping with index_options set on all of its dense_vector fields.
+
+    index_type is one of vector_index_types; None returns the mapping unchanged. m and ef_construction
+    tune the HNSW graph, confidence_interval the quantile range of the int8 / int4 scalar quantization.
+    """
+    if index_type is None:
+        return mapping
+    if index_type not in vector_index_types:
+        raise ValueError(f"Invalid vector index type: {index_type}. Expected one of {', '.join(vector_index_types)}")
+
+    options = {"type": index_type}
+    if m is not None:
+        options["m"] = m
+    if ef_construction is not None:
+        options["ef_construction"] = ef_construction
+    if confidence_interval is not None and index_type != "hnsw":
+        options["confidence_interval"] = confidence_interval
+
+    mapping = copy.deepcopy(mapping)
+    for path, spec in iter_dense_vector_fields(mapping):
+        if index_type == "int4_hnsw" and spec["dims"] % 2:
+            raise ValueError(f"int4_hnsw needs an even number of dims; {path} has {spec['dims']}")
+        spec["index"] = True
+        spec["index_options"] = options
+    return mapping
+
+
+
+def with_vector_dims(mapping, dims):
+    """Copy of mapping with the dims of its dense_vector fields set to dims, e.g. after a projection."""
+    mapping = copy.deepcopy(mapping)
+    for _, spec in iter_dense_vector_fields(mapping):
+        spec["dims"] = dims
+    return mapping
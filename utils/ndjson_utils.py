@@ -0,0 +1,252 @@
+import gzip
+import io
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+compression_suffixes = {"gz": ".gz", "zst": ".zst", "none": ""}
+
+
+def _orjson_loads(data):
+    return orjson.loads(data)
+
+
+def _json_loads(data):
+    return json.loads(data)
+
+
+def available_decoders():
+    """Names accepted by ``get_decoder``, fastest first."""
+    return (["orjson"] if orjson is not None else []) + ["json"]
+
+
+def get_decoder(name="auto"):
+    """
+    Returns a ``loads`` callable for the requested decoder.
+
+    "auto" picks orjson when it is installed and falls back to the stdlib json module.
+    """
+    if name == "auto":
+        name = available_decoders()[0]
+    if name == "orjson":
+        if orjson is None:
+            raise ValueError("Decoder 'orjson' requested but orjson is not installed")
+        return _orjson_loads
+    if name == "json":
+        return _json_loads
+    raise ValueError(f"Invalid decoder: {name}")
+
+
+def _default(value):
+    # numpy arrays and scalars, e.g. rows of a memory-mapped vector sidecar
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(record):
+    """
+    Serializes a record to compact UTF-8 JSON bytes, ready to be sent as a bulk body.
+
+    With orjson, numpy vectors are serialized straight from their buffer without a Python list copy.
+    """
+    if orjson is not None:
+        return orjson.dumps(record, default=_default, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(record, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+def is_compressed(file_path):
+    return file_path.endswith((".gz", ".zst"))
+
+
+def _require_zstandard(file_path):
+    if zstandard is None:
+        raise RuntimeError(f"{file_path} is zstd-compressed but the zstandard package is not installed")
+
+
+def resolve_ndjson_path(file_path):
+    """Returns file_path, or its .zst / .gz variant when only a compressed copy exists."""
+    if os.path.exists(file_path):
+        return file_path
+    for suffix in (".zst", ".gz"):
+        if os.path.exists(file_path + suffix):
+            return file_path + suffix
+    return file_path
+
+
+def open_ndjson_reader(file_path):
+    """Opens file_path for streaming binary reads, decompressing .gz and .zst by suffix."""
+    if file_path.endswith(".gz"):
+        return gzip.open(file_path, 'rb')
+    if file_path.endswith(".zst"):
+        _require_zstandard(file_path)
+        reader = zstandard.ZstdDecompressor().stream_reader(open(file_path, 'rb'), closefd=True)
+        return io.BufferedReader(reader, buffer_size=1024 * 1024)
+    return open(file_path, 'rb')
+
+
+def open_ndjson_writer(file_path, compression_level=None):
+    """
+    Opens file_path for writing NDJSON bytes, compressing by suffix (.gz or .zst).
+
+    zstd output is compressed on all cores when the zstandard package is installed.
+    """
+    if file_path.endswith(".gz"):
+        return gzip.open(file_path, 'wb', compresslevel=compression_level or 6)
+    if file_path.endswith(".zst"):
+        _require_zstandard(file_path)
+        compressor = zstandard.ZstdCompressor(level=compression_level or 3, threads=-1)
+        return compressor.stream_writer(open(file_path, 'wb'), closefd=True)
+    return open(file_path, 'wb')
+
+
+def _skip_to(f, file_path, offset):
+    # Compressed streams can only be skipped forward by decompressing; plain files seek directly
+    if not is_compressed(file_path):
+        f.seek(offset)
+        return
+    remaining = offset
+    while remaining:
+        skipped = len(f.read(min(remaining, 1024 * 1024)))
+        if not skipped:
+            return
+        remaining -= skipped
+
+
+def iter_ndjson_lines(file_path, start_offset=0, start_line=0, decoder="auto"):
+    """
+    Generator that streams an NDJSON file from a byte offset.
+
+    Yields (end_offset, line_number, record) for every non-empty line, where end_offset is the
+    byte position just past the line. Resuming from end_offset never re-reads that record.
+    Offsets of .gz / .zst files count decompressed bytes.
+    """
+    loads = get_decoder(decoder)
+    offset = start_offset
+    line_number = start_line
+    with open_ndjson_reader(file_path) as f:
+        if start_offset:
+            _skip_to(f, file_path, start_offset)
+        for line in f:
+            offset += len(line)
+            line_number += 1
+            if not line.strip():  # Skip empty lines
+                continue
+            yield offset, line_number, loads(line)
+
+
+def iter_ndjson(file_path, decoder="auto"):
+    """Generator that streams the records of an NDJSON file, skipping empty lines."""
+    for _, _, record in iter_ndjson_lines(file_path, decoder=decoder):
+        yield record
+
+
+def iter_byte_ranges(file_path, block_size, start_offset=0):
+    """Yields (start, end) byte ranges of roughly block_size that always end on a line boundary."""
+    with open(file_path, 'rb') as f:
+        file_size = os.fstat(f.fileno()).st_size
+        start = start_offset
+        while start < file_size:
+            f.seek(min(start + block_size, file_size))
+            f.readline()  # Run on to the end of the line the block boundary fell into
+            end = min(f.tell(), file_size)
+            yield start, end
+            start = end
+
+
+def iter_compressed_blocks(file_path, block_size, start_offset=0):
+    """
+    Yields (start, data) blocks of roughly block_size decompressed bytes, ending on a line boundary.
+
+    Compressed files cannot be split by byte range, so the main process decompresses and the
+    workers only decode.
+    """
+    with open_ndjson_reader(file_path) as f:
+        _skip_to(f, file_path, start_offset)
+        start = start_offset
+        while True:
+            data = f.read(block_size)
+            if not data:
+                return
+            data += f.readline()
+            yield start, data
+            start += len(data)
+
+
+def parse_ndjson_data(data, start, decoder="auto", build=None):
+    """
+    Decodes a block of NDJSON lines that begins at byte offset start.
+
+    Returns:
+    - A (items, line_count) tuple where items holds (end_offset, line_index_in_block, value) for every
+      non-empty line. value is build(record) when build is given, otherwise the record itself.
+    """
+    loads = get_decoder(decoder)
+    items = []
+    offset = start
+    line_count = 0
+    for line in io.BytesIO(data):
+        offset += len(line)
+        line_count += 1
+        if not line.strip():  # Skip empty lines
+            continue
+        record = loads(line)
+        items.append((offset, line_count, build(record) if build else record))
+    return items, line_count
+
+
+def parse_ndjson_block(file_path, start, end, decoder="auto", build=None):
+    """Reads and decodes the lines in one byte range of a plain file. Runs inside the parse worker processes."""
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return parse_ndjson_data(data, start, decoder, build)
+
+
+def parallel_iter_ndjson_lines(file_path, workers, start_offset=0, start_line=0, decoder="auto", build=None,
+                               block_size=4 * 1024 * 1024, max_pending_blocks=None):
+    """
+    Multi-process counterpart of iter_ndjson_lines.
+
+    The file is cut into newline-aligned byte ranges that are decoded (and optionally turned into bulk
+    actions by build, which must be picklable) in a process pool. Results are yielded in file order, and
+    at most max_pending_blocks ranges are in flight so memory stays bounded on multi-GB exports.
+    For .gz / .zst files the main process decompresses and ships the blocks to the workers.
+    """
+    max_pending_blocks = max_pending_blocks or workers * 2
+    line_number = start_line
+    pending = deque()
+
+    def drain(future):
+        nonlocal line_number
+        items, line_count = future.result()
+        for end_offset, line_index, value in items:
+            yield end_offset, line_number + line_index, value
+        line_number += line_count
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        if is_compressed(file_path):
+            tasks = ((parse_ndjson_data, data, start, decoder, build)
+                     for start, data in iter_compressed_blocks(file_path, block_size, start_offset))
+        else:
+            tasks = ((parse_ndjson_block, file_path, start, end, decoder, build)
+                     for start, end in iter_byte_ranges(file_path, block_size, start_offset))
+
+        for task in tasks:
+            pending.append(pool.submit(*task))
+            if len(pending) >= max_pending_blocks:
+                yield from drain(pending.popleft())
+
+        while pending:
+            yield from drain(pending.popleft())
@@ -1,29 +1,175 @@
-import openai
+import random
+import threading
 import time
-import utils.es_config
-from utils import es_config
-from variables import openai_embedding_deployment_name
+
+import openai
+from variables import openai_embedding_deployment_name, openai_embedding_max_inputs, \
+    openai_embedding_max_input_tokens, openai_embedding_max_request_tokens, openai_embedding_requests_per_minute, \
+    openai_embedding_tokens_per_minute, openai_embedding_cache_path, openai_embedding_cache_max_entries
 from variables import openai_api_type, openai_api_base, openai_api_version
+from utils.embedding_cache import EmbeddingCache
+from utils.rate_limiter import RateLimiter
 import streamlit as st
 
-def get_embedding(input_text):
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except ImportError:
+    _encoding = None
+
+# Shared by every caller in the process, so concurrent batches stay under the deployment's quota together
+embedding_rate_limiter = RateLimiter(openai_embedding_requests_per_minute, openai_embedding_tokens_per_minute)
+
+# Endpoint / key overrides set by configure_openai
+_overrides = {}
+_configure_lock = threading.Lock()
+_embedding_cache = None
+
+
+def configure_openai(api_base=None, api_key=None):
+    """
+    Overrides the embedding endpoint and key of variables.py and the streamlit secret, e.g. to point an
+    ingest run at a local stub embedding server.
+
+    The openai module globals are never touched: the completion helpers rewrite them per call, so every
+    embedding request passes its own credentials (see _request_credentials).
+    """
+    with _configure_lock:
+        if api_base:
+            _overrides["api_base"] = api_base
+        if api_key:
+            _overrides["api_key"] = api_key
+
+
+def _request_credentials():
+    """The api_type / api_base / api_version / api_key of one embedding request."""
+    return {
+        "api_type": openai_api_type,
+        "api_base": _overrides.get("api_base") or openai_api_base,
+        "api_version": openai_api_version,
+        "api_key": _overrides.get("api_key") or st.secrets['pass']
+    }
+
+
+def get_embedding_cache():
+    """The process-wide embedding cache, or None when openai_embedding_cache_path is unset."""
+    global _embedding_cache
+    with _configure_lock:
+        if _embedding_cache is None and openai_embedding_cache_path:
+            _embedding_cache = EmbeddingCache(openai_embedding_cache_path, openai_embedding_cache_max_entries)
+    return _embedding_cache
+
 
-    openai.api_type = openai_api_type
-    openai.api_base = openai_api_base
-    openai.api_version = openai_api_version
+def count_tokens(text):
+    """cl100k_base token count (ada-002's tokenizer) when tiktoken is installed, else a ~4 chars/token estimate."""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
 
 
-    # Set the GPT-3 API key
-    openai.api_key = st.secrets['pass']
+def iter_batches(texts, max_inputs=openai_embedding_max_inputs, max_tokens=openai_embedding_max_request_tokens):
+    """
+    Packs texts into requests of at most max_inputs texts and max_tokens tokens.
 
-    response = openai.Embedding.create(
-        input=input_text,
-        engine=openai_embedding_deployment_name,
-        max_tokens=25
-    )
-    #print (input_text)
+    Yields (positions, texts, token_count) tuples; positions index into the input list.
+    """
+    positions = []
+    batch = []
+    batch_tokens = 0
+    for position, text in enumerate(texts):
+        tokens = count_tokens(text)
+        if tokens > openai_embedding_max_input_tokens:
+            raise ValueError(f"Text {position} has {tokens} tokens, more than the deployment accepts "
+                             f"({openai_embedding_max_input_tokens})")
+        if batch and (len(batch) >= max_inputs or batch_tokens + tokens > max_tokens):
+            yield positions, batch, batch_tokens
+            positions, batch, batch_tokens = [], [], 0
+        positions.append(position)
+        batch.append(text)
+        batch_tokens += tokens
+    if batch:
+        yield positions, batch, batch_tokens
 
-    embeddings = response['data'][0]['embedding']
-    print(embeddings)
-    time.sleep(es_config.rate_throttle)
+
+def _retry_after(error):
+    """Seconds the server asked us to wait, from retry-after-ms or Retry-After, or None."""
+    headers = getattr(error, "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("Retry-After"):
+            return float(headers["Retry-After"])
+    except ValueError:
+        pass
+    return None
+
+
+def embed_batch(texts, token_count=None, rate_limiter=embedding_rate_limiter, max_retries=6, initial_backoff=1.0,
+                max_backoff=60.0):
+    """
+    Embeds one packed batch with a single request. Returns the vectors in input order.
+
+    Rate limit errors pause the shared limiter for the server's Retry-After (or an exponential backoff);
+    transient connection errors are retried with backoff. Other errors are raised.
+    """
+    credentials = _request_credentials()
+    if token_count is None:
+        token_count = sum(count_tokens(text) for text in texts)
+
+    backoff = initial_backoff
+    for attempt in range(max_retries + 1):
+        rate_limiter.acquire(token_count)
+        try:
+            response = openai.Embedding.create(input=texts, engine=openai_embedding_deployment_name, **credentials)
+            # The service may answer out of order; index says which input each vector belongs to
+            data = sorted(response['data'], key=lambda item: item['index'])
+            return [item['embedding'] for item in data]
+        except openai.error.RateLimitError as e:
+            if attempt == max_retries:
+                raise
+            wait = _retry_after(e) or backoff
+            print(f"Rate Limit Error: {e}. Retrying in {wait:.1f} seconds...")
+            rate_limiter.pause(wait)
+        except (openai.error.ServiceUnavailableError, openai.error.APIConnectionError, openai.error.Timeout) as e:
+            if attempt == max_retries:
+                raise
+            wait = backoff * (1 + random.random())
+            print(f"Embedding request failed: {e}. Retrying in {wait:.1f} seconds...")
+            time.sleep(wait)
+        backoff = min(backoff * 2, max_backoff)
+
+
+def get_embeddings(texts, rate_limiter=embedding_rate_limiter, use_cache=True):
+    """
+    Embeds a list of texts with as few requests as the deployment's input and token limits allow.
+
+    Texts found in the embedding cache are not sent, and repeated texts are sent once.
+    Returns:
+    - A list of vectors, one per text, in input order.
+    """
+    cache = get_embedding_cache() if use_cache else None
+    embeddings = cache.get_many(openai_embedding_deployment_name, texts) if cache else [None] * len(texts)
+
+    missing = {}
+    for position, (text, embedding) in enumerate(zip(texts, embeddings)):
+        if embedding is None:
+            missing.setdefault(text, []).append(position)
+    if not missing:
+        return embeddings
+
+    missing_texts = list(missing)
+    new_embeddings = [None] * len(missing_texts)
+    for positions, batch, token_count in iter_batches(missing_texts):
+        for position, embedding in zip(positions, embed_batch(batch, token_count, rate_limiter)):
+            new_embeddings[position] = embedding
+    if cache:
+        cache.put_many(openai_embedding_deployment_name, missing_texts, new_embeddings)
+
+    for text, embedding in zip(missing_texts, new_embeddings):
+        for position in missing[text]:
+            embeddings[position] = embedding
     return embeddings
+
+
+def get_embedding(input_text):
+    return get_embeddings([input_text])[0]
@@ -0,0 +1,96 @@
+import functools
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from utils.vector_sidecar import get_field, set_field
+
+projection_methods = ("pca", "truncate")
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Vector projections need numpy. Install it with `pip install numpy`.")
+
+
+def fit_projection(matrix, dims, method="pca"):
+    """
+    Fits a projection of the rows of matrix down to dims dimensions.
+
+    pca keeps the dims directions of largest variance (eigenvectors of the covariance matrix); truncate
+    keeps the first dims coordinates. Returns a dictionary that save_projection writes and project applies.
+    """
+    _require_numpy()
+    if method not in projection_methods:
+        raise ValueError(f"Invalid projection method: {method}. Expected one of {', '.join(projection_methods)}")
+    source_dims = matrix.shape[1]
+    if method == "truncate":
+        mean = np.zeros(source_dims, dtype=np.float32)
+        components = np.eye(dims, source_dims, dtype=np.float32)
+    else:
+        mean = matrix.mean(axis=0, dtype=np.float64)
+        centered = matrix - mean
+        # eigh of the d x d covariance is much cheaper than an SVD of the n x d data
+        eigenvalues, eigenvectors = np.linalg.eigh(centered.T @ centered)
+        components = eigenvectors[:, np.argsort(eigenvalues)[::-1][:dims]].T
+    return {
+        "method": method,
+        "source_dims": source_dims,
+        "dims": dims,
+        "mean": np.asarray(mean, dtype=np.float32),
+        "components": np.asarray(components, dtype=np.float32)
+    }
+
+
+def save_projection(projection, path):
+    np.savez(path, method=projection["method"], source_dims=projection["source_dims"], dims=projection["dims"],
+             mean=projection["mean"], components=projection["components"])
+
+
+@functools.lru_cache(maxsize=None)
+def load_projection(path):
+    _require_numpy()
+    with np.load(path) as data:
+        return {
+            "method": str(data["method"]),
+            "source_dims": int(data["source_dims"]),
+            "dims": int(data["dims"]),
+            "mean": data["mean"],
+            "components": data["components"]
+        }
+
+
+def project(vectors, projection):
+    """
+    Projects one vector or a matrix of row vectors. Results are unit length, which the ada-002 index's
+    dot_product similarity requires.
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    projected = (vectors - projection["mean"]) @ projection["components"].T
+    norms = np.linalg.norm(projected, axis=-1, keepdims=True)
+    return projected / np.where(norms == 0, 1, norms)
+
+
+def project_query_vector(vector, projection_path):
+    """Applies the projection at projection_path to a query vector; without a path the vector is returned as is."""
+    if not projection_path:
+        return vector
+    return project(vector, load_projection(projection_path)).tolist()
+
+
+def project_vectors(lines, vector_field, projection_path):
+    """
+    Pipeline stage that replaces the vector_field of every record with its projection.
+
+    lines yields (end_offset, line_number, record) tuples like iter_ndjson_lines.
+    """
+    projection = load_projection(projection_path)
+    for end_offset, line_number, record in lines:
+        vector = get_field(record, vector_field)
+        if vector is not None:
+            if len(vector) != projection["source_dims"]:
+                raise ValueError(f"Vector has {len(vector)} dims, the projection expects {projection['source_dims']}")
+            set_field(record, vector_field, project(vector, projection))
+        yield end_offset, line_number, record
@@ -1,51 +1,51 @@
+import argparse
 import sys
 
-from elasticsearch import Elasticsearch, helpers
-
+from utils.es_config import ada002_index_name
 from utils.es_helper import create_es_client
+from utils.export_utils import export_index, default_compression
+from utils.ndjson_utils import compression_suffixes
+from utils.vector_sidecar import vector_dtypes
 import streamlit as st
 
 
-try:
-    username = st.secrets['es_username']
-    password = st.secrets['es_password']
-    cloudid = st.secrets['es_cloudid']
-    es = create_es_client(username, password, cloudid)
-except Exception as e:
-    print("Connection failed", str(e))
-    sys.exit(1)
-
-
-
-def fetch_all_records_from_index(es, index_name):
-    """Generator that yields all records from an Elasticsearch index."""
-    query_body = {
-        "query": {
-            "match_all": {}
-        }
-    }
-
-    # Use the scan helper to fetch records without a size limit
-    for record in helpers.scan(es, query=query_body, index=index_name):
-        yield record['_source']
-
-
-def main():
-    # Connect to Elasticsearch
-
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export an index to sharded NDJSON files.")
     # Name of the index you want to pull records from
-    index_name = "workplace-app-tariffs-summary-ada-002"
-
-    # Output file
-    output_file = "../output/workplace-app-tariffs-summary-ada-002.json"
-
-    with open(output_file, 'w', encoding='utf-8') as f:
-        for record in fetch_all_records_from_index(es, index_name):
-            # Write each document as a single line (serialized as JSON)
-            f.write(json.dumps(record) + "\n")
+    parser.add_argument("--index", default=ada002_index_name, help="Index to export.")
+    parser.add_argument("--output-dir", default="../output", help="Directory the shards are written to.")
+    parser.add_argument("--slices", type=int, default=4,
+                        help="Number of parallel sliced search_after cursors (and output shards).")
+    parser.add_argument("--compression", default=default_compression, choices=sorted(compression_suffixes),
+                        help="Compression of the output shards.")
+    parser.add_argument("--include", action="append", help="_source field to include. Repeatable.")
+    parser.add_argument("--exclude", action="append",
+                        help="_source field to exclude, e.g. vector_query_field.predicted_value. Repeatable.")
+    parser.add_argument("--vector-field",
+                        help="Write this vector field to a binary .npy sidecar per shard instead of inline JSON, "
+                             "e.g. vector_query_field.predicted_value.")
+    parser.add_argument("--vector-dtype", default="float32", choices=vector_dtypes,
+                        help="Storage type of the sidecar vectors.")
+    parser.add_argument("--page-size", type=int, default=1000, help="Documents fetched per search request.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    try:
+        username = st.secrets['es_username']
+        password = st.secrets['es_password']
+        cloudid = st.secrets['es_cloudid']
+        es = create_es_client(username, password, cloudid)
+    except Exception as e:
+        print("Connection failed", str(e))
+        sys.exit(1)
+
+    export_index(es, args.index, args.output_dir, slices=args.slices, compression=args.compression,
+                 source_includes=args.include, source_excludes=args.exclude, page_size=args.page_size,
+                 vector_field=args.vector_field, vector_dtype=args.vector_dtype)
 
 
 if __name__ == "__main__":
-    import json
-
     main()
@@ -1,674 +1,496 @@
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
 
 from utils.es_config import index_name, elser_index_name, elser_model, model, vector_embedding_field, \
-    elser_embedding_field, ada002_index_name
+    elser_embedding_field, ada002_index_name, ada002_projection_path, debug_queries, search_cache_ttl, \
+    search_cache_max_entries, search_cache_path, index_generation_check_interval, fusion_weights, fusion_deadline_ms, \
+    fusion_timeout_margin_ms, pre_search_deadline_ms, facet_cache_ttl
+from utils.fusion import fuse, multi_search
 from utils.openai_embedder import get_embedding
+from utils.projection_utils import project_query_vector
+from utils.query_templates import TemplateRegistry, slot
+from utils.result_cache import SearchResultCache, index_generation, search_cache_key
 
 from utils.openai_helper import get_openai_guidance, get_openai_guidance_no_context, \
     get_openai_large_guidance
 from variables import ner_model
 
+# Keyword fields the sidebar filters apply to, in the order the filter clauses are added
+filter_fields = {
+    "authors": "metadata.author.keyword",
+    "companies": "metadata.company.keyword",
+    "states": "metadata.state.keyword"
+}
 
-def build_bm25_query(user_query, selected_authors=[], selected_states=[], selected_companies=[] ):
-    # Base query
-    base_query = {
-        "match": {
-            "text_field": {
-                "query": user_query  # Use the passed in user query
-            }
-        }
-    }
 
-    filters = []
+# Hit fields search_tariffs and the openai_helper functions read, besides the text they answer from
+hit_metadata_fields = ["metadata.author", "metadata.company", "metadata.state", "metadata.url",
+                       "metadata.tarrif_title"]
 
-    # If authors are selected, we'll add a filter
-    if selected_authors:
-        filters.append({
-            "terms": {
-                "metadata.author.keyword": selected_authors
-            }
-        })
+# _source fields returned per search type. Vectors, ELSER tokens and the rest of the metadata stay on the server.
+searchtype_source_includes = {
+    "BM25": ["text_field", *hit_metadata_fields],
+    "Vector Hybrid": ["text_field", *hit_metadata_fields],
+    "Elser Hybrid": ["text", *hit_metadata_fields],
+    "Vector": ["text_field", *hit_metadata_fields],
+    "Reciprocal Rank Fusion": ["text_field", *hit_metadata_fields],
+    "Elser": ["text", *hit_metadata_fields],
+    "Vector OpenAI": ["content", *[field for field in hit_metadata_fields if field != "metadata.author"]],
+    "Client Fusion": ["text_field", "text", *hit_metadata_fields]
+}
 
-    # If companies are selected, we'll add a filter
-    if selected_companies:
-        filters.append({
-            "terms": {
-                "metadata.company.keyword": selected_companies
-            }
-        })
+# Response parts the app reads; shards, totals, max_score and the like are not sent back
+search_filter_path = "took,timed_out,hits.hits._id,hits.hits._score,hits.hits._rank,hits.hits._source"
+msearch_filter_path = ",".join(["responses.error", *(f"responses.{path}" for path in search_filter_path.split(","))])
+facet_filter_path = "aggregations"
 
-    # If states are selected, we'll add a filter
-    if selected_states:
-        filters.append({
-            "terms": {
-                "metadata.state.keyword": selected_states
-            }
-        })
 
-    # Combining the base query and filters
-    if filters:
-        base_query = {
-            "bool": {
-                "must": base_query,
-                "filter": filters
-            }
-        }
+def _terms_facet(field):
+    return {"terms": {"field": field, "min_doc_count": 1}}
 
-    full_query = {
-        "query": base_query,
-        "aggs": {
-            "author_facet": {
-                "terms": {
-                    "field": "metadata.author.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "company_facet": {
-                "terms": {
-                    "field": "metadata.company.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "state_facet": {
-                "terms": {
-                    "field": "metadata.state.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "tarrif_category_facet": {
-                "terms": {
-                    "field": "metadata.tarrif_category.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "tarrif_type_facet": {
-                "terms": {
-                    "field": "metadata.tarrif_type.keyword",
-                    "min_doc_count": 1
-                }
-            }
-        }
-    }
 
-    # Dump the assembled query for debugging
-    print(json.dumps(full_query, indent=4))
+# Facet aggregations of the different search types, fetched separately from the hits by get_facets
+tarrif_facets = {
+    "author_facet": _terms_facet("metadata.author.keyword"),
+    "company_facet": _terms_facet("metadata.company.keyword"),
+    "state_facet": _terms_facet("metadata.state.keyword"),
+    "tarrif_category_facet": _terms_facet("metadata.tarrif_category.keyword"),
+    "tarrif_type_facet": _terms_facet("metadata.tarrif_type.keyword")
+}
 
-    return full_query
+hybrid_facets = {
+    "author_facet": _terms_facet("metadata.author.keyword"),
+    "company_facet": _terms_facet("metadata.company.keyword"),
+    "state_facet": _terms_facet("metadata.state.keyword"),
+    "tariff_category_facet": _terms_facet("metadata.tariff_category.keyword"),
+    "tariff_type_facet": _terms_facet("metadata.tariff_type.keyword")
+}
 
+author_state_company_facets = {
+    "author_facet": _terms_facet("metadata.author.keyword"),
+    "state_facet": _terms_facet("metadata.state.keyword"),
+    "company_facet": _terms_facet("metadata.company.keyword")
+}
 
-def build_hybrid_query(user_query, selected_authors, selected_states, selected_companies, BM25_Boost, KNN_Boost):
-    """
-    Builds a hybrid Elasticsearch query based on the provided parameters.
+openai_facets = {
+    "company_facet": _terms_facet("metadata.company.keyword"),
+    "state_facet": _terms_facet("metadata.state.keyword"),
+    "tariff_category_facet": _terms_facet("metadata.tariff_type.keyword"),
+    "tariff_type_facet": _terms_facet("metadata.tariff_type.keyword")
+}
 
-    Returns:
-    - A dictionary representing the Elasticsearch query.
-    """
 
-    # Base structure for text match query
-    text_query = {
-        "query": "Does Demethanized contain isobutane in texas",
-        "boost": BM25_Boost
-    }
+def _filter_clauses(active_filters):
+    return [{"terms": {filter_fields[name]: slot(name)}} for name in active_filters]
 
-    # Base structure for knn
-    knn_structure = {
-        "field": vector_embedding_field,
-        "k": 10,
-        "num_candidates": 100,
-        "query_vector_builder": {
-            "text_embedding": {
-                "model_id": model,
-                "model_text": user_query
-            }
-        },
-        "boost": KNN_Boost
-    }
 
-    main_filters = []
-    if selected_authors:
-        main_filters.append({
-            "terms": {
-                "metadata.author.keyword": selected_authors
-            }
-        })
+def _active_filters(selected_authors=None, selected_companies=None, selected_states=None):
+    """Names of the filters that have values, which selects the compiled shape."""
+    selected = {"authors": selected_authors, "companies": selected_companies, "states": selected_states}
+    return tuple(name for name in filter_fields if selected[name])
 
-    # If companies are selected, we'll add a filter
-    if selected_companies:
-        main_filters.append({
-            "terms": {
-                "metadata.company.keyword": selected_companies
-            }
-        })
 
-    if selected_states:
-        main_filters.append({
-            "terms": {
-                "metadata.state.keyword": selected_states
-            }
-        })
+def _text_embedding_builder():
+    return {"text_embedding": {"model_id": model, "model_text": slot("query")}}
 
-    # Copy the main_filters for the knn part
-    knn_filters = list(main_filters)
 
+def _bm25_shape(active_filters):
+    base_query = {"match": {"text_field": {"query": slot("query")}}}
+    if active_filters:
+        base_query = {"bool": {"must": base_query, "filter": _filter_clauses(active_filters)}}
+    return {"query": base_query}
+
+
+def _hybrid_shape(active_filters):
+    filters = _filter_clauses(active_filters)
     query = {
         "query": {
             "bool": {
-                "must": {
-                    "match": {
-                        "text": text_query
-                    }
-                },
-                "filter": main_filters
+                "must": {"match": {"text": {"query": slot("query"), "boost": slot("bm25_boost")}}},
+                "filter": filters
             }
         },
-        "knn": knn_structure,
-        "aggs": {
-            "author_facet": {
-                "terms": {
-                    "field": "metadata.author.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "company_facet": {
-                "terms": {
-                    "field": "metadata.company.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "state_facet": {
-                "terms": {
-                    "field": "metadata.state.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "tariff_category_facet": {
-                "terms": {
-                    "field": "metadata.tariff_category.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "tariff_type_facet": {
-                "terms": {
-                    "field": "metadata.tariff_type.keyword",
-                    "min_doc_count": 1
-                }
-            }
+        "knn": {
+            "field": vector_embedding_field,
+            "k": 10,
+            "num_candidates": 100,
+            "query_vector_builder": _text_embedding_builder(),
+            "boost": slot("knn_boost")
         }
     }
-
-    if knn_filters:
-        query["knn"]["filter"] = knn_filters
-
+    if filters:
+        query["knn"]["filter"] = filters
     return query
 
 
-def build_elser_hybrid_query(user_query, selected_authors, selected_states, selected_companies,  bm25_boost, elser_boost):
-    """
-    Builds an Elasticsearch hybrid query combining BM25 and Elser.
-
-    Returns:
-    - A dictionary representing the Elasticsearch query.
-    """
-
-    # Base structure for text_expansion
-    text_expansion_structure = {
-        "text_expansion": {
-            elser_embedding_field: {
-                "model_text": user_query,
-                "model_id": elser_model
-            }
-        }
-    }
-
-    text_expansion_structure["text_expansion"][elser_embedding_field]["boost"] = elser_boost
-
-    # Base structure for query_string
-    query_string_structure = {
-        "query_string": {
-            "default_field": "text",  # Assuming text is the main field you're querying
-            "query": user_query
-        }
-    }
-
-    query_string_structure["query_string"]["boost"] = bm25_boost
-
-    query = {
+def _elser_hybrid_shape(active_filters):
+    return {
         "query": {
             "bool": {
                 "should": [
-                    text_expansion_structure,
-                    query_string_structure
+                    {"text_expansion": {elser_embedding_field: {"model_text": slot("query"), "model_id": elser_model,
+                                                                "boost": slot("elser_boost")}}},
+                    {"query_string": {"default_field": "text", "query": slot("query"), "boost": slot("bm25_boost")}}
                 ],
-                "filter": []
-            }
-        },
-        "aggs": {
-            "author_facet": {
-                "terms": {
-                    "field": "metadata.author.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "state_facet": {
-                "terms": {
-                    "field": "metadata.state.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "company_facet": {
-                "terms": {
-                    "field": "metadata.company.keyword",
-                    "min_doc_count": 1
-                }
+                "filter": _filter_clauses(active_filters)
             }
         }
     }
 
-    filters = []
-    if selected_authors:
-        filters.append({
-            "terms": {
-                "metadata.author.keyword": selected_authors
-            }
-        })
-
-    # If companies are selected, we'll add a filter
-    if selected_companies:
-        filters.append({
-            "terms": {
-                "metadata.company.keyword": selected_companies
-            }
-        })
-
-    if selected_states:
-        filters.append({
-            "terms": {
-                "metadata.state.keyword": selected_states
-            }
-        })
 
-    if filters:
-        query["query"]["bool"]["filter"] = filters
+def _knn_shape(active_filters):
+    knn_query = {
+        "field": vector_embedding_field,
+        "k": 10,
+        "num_candidates": 100,
+        "query_vector_builder": _text_embedding_builder()
+    }
+    if active_filters:
+        knn_query["filter"] = {"bool": {"filter": _filter_clauses(active_filters)}}
+    return {"knn": knn_query}
 
-    return query
 
+def _rrf_shape(active_filters):
+    filters = _filter_clauses(active_filters)
+    return {
+        "query": {"bool": {"must": {"match": {"text": slot("query")}}, "filter": filters}},
+        "knn": {
+            "field": vector_embedding_field,
+            "query_vector_builder": _text_embedding_builder(),
+            "k": 10,
+            "num_candidates": 100,
+            "filter": filters
+        },
+        "rank": {"rrf": {"window_size": slot("rrf_window_size"), "rank_constant": slot("rrf_rank_constant")}}
+    }
 
-def build_knn_query(user_query, selected_authors=None, selected_states=None, selected_companies=None):
-    """
-    Builds an Elasticsearch KNN query based on the provided parameters.
 
-    Parameters:
-    - user_query: The query text input by the user.
-    - selected_authors (optional): List of selected authors.
-    - selected_states (optional): List of selected states.
+def _elser_shape(active_filters):
+    base_query = {"text_expansion": {elser_embedding_field: {"model_id": elser_model, "model_text": slot("query")}}}
+    if active_filters:
+        base_query = {"bool": {"must": base_query, "filter": _filter_clauses(active_filters)}}
+    return {"size": 5, "query": base_query}
 
-    Returns:
-    - A dictionary representing the Elasticsearch KNN query.
-    """
 
-    # Base KNN query structure
+def _openai_shape(active_filters, has_optional_state):
     knn_query = {
-        "field": vector_embedding_field,  # Adjust according to your ES schema
+        "field": "vector_query_field.predicted_value",  # Field containing the OpenAI embeddings
         "k": 10,
         "num_candidates": 100,
-        "query_vector_builder": {
-            "text_embedding": {
-                "model_id": model,
-                "model_text": user_query
-            }
-        }
+        "query_vector": slot("vector")
     }
+    bool_query = {}
+    if has_optional_state:
+        bool_query["should"] = {"term": {"metadata.state.keyword": slot("optional_state")}}
+    # The OpenAI search filters states before companies
+    filters = _filter_clauses([name for name in ("states", "companies") if name in active_filters])
+    if filters:
+        bool_query["filter"] = filters
+    if bool_query:
+        knn_query["filter"] = {"bool": bool_query}
+    return {"knn": knn_query}
 
-    filters = []
 
-    # If authors are selected, add the author filter
-    if selected_authors:
-        filters.append({
-            "terms": {
-                "metadata.author.keyword": selected_authors
-            }
-        })
+# Retrievers of the client-side fusion search: one plain ranked list each, no aggregations
+_fusion_source = {"includes": searchtype_source_includes["Client Fusion"]}
 
-    # If companies are selected, we'll add a filter
-    if selected_companies:
-        filters.append({
-            "terms": {
-                "metadata.company.keyword": selected_companies
-            }
-        })
 
-    # If states are selected, add the state filter
-    if selected_states:
-        filters.append({
-            "terms": {
-                "metadata.state.keyword": selected_states
-            }
-        })
+def _bm25_retriever_shape(active_filters):
+    query = {"match": {"text_field": {"query": slot("query")}}}
+    if active_filters:
+        query = {"bool": {"must": query, "filter": _filter_clauses(active_filters)}}
+    return {"size": slot("size"), "timeout": slot("timeout"), "_source": _fusion_source, "query": query}
 
-    # If there are any filters, add them to the KNN query
-    if filters:
-        knn_query["filter"] = {
-            "bool": {
-                "filter": filters
-            }
-        }
 
-    # Final query structure including aggregations
-    full_query = {
-        "knn": knn_query,
-        "aggs": {
-            "author_facet": {
-                "terms": {
-                    "field": "metadata.author.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "company_facet": {
-                "terms": {
-                    "field": "metadata.company.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "state_facet": {
-                "terms": {
-                    "field": "metadata.state.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "tarrif_category_facet": {
-                "terms": {
-                    "field": "metadata.tarrif_category.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "tarrif_type_facet": {
-                "terms": {
-                    "field": "metadata.tarrif_type.keyword",
-                    "min_doc_count": 1
-                }
-            }
-        }
+def _minilm_knn_retriever_shape(active_filters):
+    knn_query = {
+        "field": vector_embedding_field,
+        "k": slot("size"),
+        "num_candidates": slot("num_candidates"),
+        "query_vector_builder": _text_embedding_builder()
     }
-
-    # Dump the assembled query for debugging
-    print(json.dumps(full_query, indent=4))
-
-    return full_query
-
-
-def build_rrf_query(user_query, selected_authors, selected_states, selected_companies, rrf_rank_constant, rrf_window_size):
+    if active_filters:
+        knn_query["filter"] = {"bool": {"filter": _filter_clauses(active_filters)}}
+    return {"size": slot("size"), "timeout": slot("timeout"), "_source": _fusion_source, "knn": knn_query}
+
+
+def _elser_retriever_shape(active_filters):
+    query = {"text_expansion": {elser_embedding_field: {"model_id": elser_model, "model_text": slot("query")}}}
+    if active_filters:
+        query = {"bool": {"must": query, "filter": _filter_clauses(active_filters)}}
+    return {"size": slot("size"), "timeout": slot("timeout"), "_source": _fusion_source, "query": query}
+
+
+# Search type: (index the facets are counted on, facet aggregations). Client Fusion counts them on the bym index.
+searchtype_facets = {
+    "BM25": (index_name, tarrif_facets),
+    "Vector Hybrid": (index_name, hybrid_facets),
+    "Elser Hybrid": (elser_index_name, author_state_company_facets),
+    "Vector": (index_name, tarrif_facets),
+    "Reciprocal Rank Fusion": (index_name, author_state_company_facets),
+    "Elser": (elser_index_name, tarrif_facets),
+    "Vector OpenAI": (ada002_index_name, openai_facets),
+    "Client Fusion": (index_name, author_state_company_facets)
+}
+
+
+def _facets_shape(searchtype, active_filters):
+    query = {"bool": {"filter": _filter_clauses(active_filters)}} if active_filters else {"match_all": {}}
+    return {"size": 0, "track_total_hits": False, "query": query, "aggs": searchtype_facets[searchtype][1]}
+
+
+# Retriever name: (index, template name)
+fusion_retrievers = {
+    "bm25": (index_name, "Fusion BM25"),
+    "minilm_knn": (index_name, "Fusion MiniLM kNN"),
+    "elser": (elser_index_name, "Fusion ELSER")
+}
+
+# Shapes are compiled once per search type and combination of filters present
+query_templates = TemplateRegistry({
+    "BM25": _bm25_shape,
+    "Vector Hybrid": _hybrid_shape,
+    "Elser Hybrid": _elser_hybrid_shape,
+    "Vector": _knn_shape,
+    "Reciprocal Rank Fusion": _rrf_shape,
+    "Elser": _elser_shape,
+    "Vector OpenAI": _openai_shape,
+    "Fusion BM25": _bm25_retriever_shape,
+    "Fusion MiniLM kNN": _minilm_knn_retriever_shape,
+    "Fusion ELSER": _elser_retriever_shape,
+    "Facets": _facets_shape
+})
+
+
+# Index each search type queries; GenAI answers without a search
+searchtype_indices = {
+    "BM25": index_name,
+    "Vector Hybrid": index_name,
+    "Elser Hybrid": elser_index_name,
+    "Vector": index_name,
+    "Reciprocal Rank Fusion": index_name,
+    "Elser": elser_index_name,
+    "Vector OpenAI": ada002_index_name,
+    "Client Fusion": f"{index_name},{elser_index_name}"
+}
+
+# Runs the independent calls that precede a search; shared by every session of the app process
+pre_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="pre-search")
+
+# Shared by every session of the app process
+search_cache = SearchResultCache(search_cache_ttl, search_cache_max_entries, search_cache_path)
+facet_cache = SearchResultCache(facet_cache_ttl, search_cache_max_entries)
+
+
+def _render(searchtype, variant, values, serialized):
+    template = query_templates.get(searchtype, variant)
+    return template.render(values) if serialized else template.fill(values)
+
+
+def _filter_values(selected_authors=None, selected_companies=None, selected_states=None):
+    return {"authors": selected_authors, "companies": selected_companies, "states": selected_states}
+
+
+def build_bm25_query(user_query, selected_authors=[], selected_states=[], selected_companies=[], serialized=False):
     """
-    Builds an Elasticsearch query with rank (rrf) for tariffs based on the provided parameters.
+    Builds a BM25 match query on text_field.
 
     Returns:
-    - A dictionary representing the Elasticsearch query.
+    - A dictionary representing the Elasticsearch query, or its JSON bytes when serialized is set.
     """
+    values = {"query": user_query, **_filter_values(selected_authors, selected_companies, selected_states)}
+    return _render("BM25", (_active_filters(selected_authors, selected_companies, selected_states),), values,
+                   serialized)
 
-    query = {
-        "query": {
-            "bool": {
-                "must": {
-                    "match": {
-                        "text": user_query  # Assuming "text" is the field containing the main tariff content
-                    }
-                },
-                "filter": []
-            }
-        },
-        "knn": {
-            "field": vector_embedding_field,  # Ensure this field aligns with your indexed data
-            "query_vector_builder": {
-                "text_embedding": {
-                    "model_id": model,
-                    "model_text": user_query
-                }
-            },
-            "k": 10,
-            "num_candidates": 100,
-            "filter": []  # Ensure the filter section is present under knn
-        },
-        "rank": {
-            "rrf": {
-                "window_size": rrf_window_size,
-                "rank_constant": rrf_rank_constant
-            }
-        },
-        "aggs": {
-            "author_facet": {
-                "terms": {
-                    "field": "metadata.author.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "state_facet": {
-                "terms": {
-                    "field": "metadata.state.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "company_facet": {
-                "terms": {
-                    "field": "metadata.company.keyword",
-                    "min_doc_count": 1
-                }
-            }
-        }
-    }
-
-    filters = []
-    if selected_authors:
-        filters.append({
-            "terms": {
-                "metadata.author.keyword": selected_authors
-            }
-        })
-
-    # If companies are selected, we'll add a filter
-    if selected_companies:
-        filters.append({
-            "terms": {
-                "metadata.company.keyword": selected_companies
-            }
-        })
-
-    if selected_states:
-        filters.append({
-            "terms": {
-                "metadata.state.keyword": selected_states
-            }
-        })
 
-    if filters:
-        query["query"]["bool"]["filter"] = filters
-        query["knn"]["filter"] = filters
+def build_hybrid_query(user_query, selected_authors, selected_states, selected_companies, BM25_Boost, KNN_Boost,
+                       serialized=False):
+    """
+    Builds a hybrid Elasticsearch query based on the provided parameters.
 
-    return query
+    Returns:
+    - A dictionary representing the Elasticsearch query, or its JSON bytes when serialized is set.
+    """
+    values = {"query": user_query, "bm25_boost": BM25_Boost, "knn_boost": KNN_Boost,
+              **_filter_values(selected_authors, selected_companies, selected_states)}
+    return _render("Vector Hybrid", (_active_filters(selected_authors, selected_companies, selected_states),),
+                   values, serialized)
 
 
-def build_elser_query(user_query, selected_authors, selected_states, selected_companies):
-    # Base query
-    base_query = {
-        "text_expansion": {
-            elser_embedding_field: {
-                "model_id": ".elser_model_1",
-                "model_text": user_query
-            }
-        }
-    }
+def build_elser_hybrid_query(user_query, selected_authors, selected_states, selected_companies,  bm25_boost, elser_boost,
+                             serialized=False):
+    """
+    Builds an Elasticsearch hybrid query combining BM25 and Elser.
 
-    filters = []
+    Returns:
+    - A dictionary representing the Elasticsearch query, or its JSON bytes when serialized is set.
+    """
+    values = {"query": user_query, "bm25_boost": bm25_boost, "elser_boost": elser_boost,
+              **_filter_values(selected_authors, selected_companies, selected_states)}
+    return _render("Elser Hybrid", (_active_filters(selected_authors, selected_companies, selected_states),),
+                   values, serialized)
 
-    # If authors are selected, we'll add a filter
-    if selected_authors:
-        filters.append({
-            "terms": {
-                "metadata.author.keyword": selected_authors
-            }
-        })
 
-    # If companies are selected, we'll add a filter
-    if selected_companies:
-        filters.append({
-            "terms": {
-                "metadata.company.keyword": selected_companies
-            }
-        })
+def build_knn_query(user_query, selected_authors=None, selected_states=None, selected_companies=None,
+                    serialized=False):
+    """
+    Builds an Elasticsearch KNN query based on the provided parameters.
 
-    # If states are selected, we'll add a filter
-    if selected_states:
-        filters.append({
-            "terms": {
-                "metadata.state.keyword": selected_states
-            }
-        })
+    Parameters:
+    - user_query: The query text input by the user.
+    - selected_authors (optional): List of selected authors.
+    - selected_states (optional): List of selected states.
+    - serialized (optional): Return the body as JSON bytes.
 
-    if filters:
-        base_query = {
-            "bool": {
-                "must": base_query,
-                "filter": filters
-            }
-        }
+    Returns:
+    - A dictionary representing the Elasticsearch KNN query.
+    """
+    values = {"query": user_query, **_filter_values(selected_authors, selected_companies, selected_states)}
+    return _render("Vector", (_active_filters(selected_authors, selected_companies, selected_states),), values,
+                   serialized)
 
-    query = {
-        "size": 5,
-        "query": base_query,
-        "aggs": {
-            "author_facet": {
-                "terms": {
-                    "field": "metadata.author.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "company_facet": {
-                "terms": {
-                    "field": "metadata.company.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "state_facet": {
-                "terms": {
-                    "field": "metadata.state.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "tarrif_category_facet": {
-                "terms": {
-                    "field": "metadata.tarrif_category.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "tarrif_type_facet": {
-                "terms": {
-                    "field": "metadata.tarrif_type.keyword",
-                    "min_doc_count": 1
-                }
-            }
-        }
-    }
 
-    print(json.dumps(query, indent=4))
-    return query
+def build_rrf_query(user_query, selected_authors, selected_states, selected_companies, rrf_rank_constant, rrf_window_size,
+                    serialized=False):
+    """
+    Builds an Elasticsearch query with rank (rrf) for tariffs based on the provided parameters.
 
+    Returns:
+    - A dictionary representing the Elasticsearch query, or its JSON bytes when serialized is set.
+    """
+    values = {"query": user_query, "rrf_rank_constant": rrf_rank_constant, "rrf_window_size": rrf_window_size,
+              **_filter_values(selected_authors, selected_companies, selected_states)}
+    return _render("Reciprocal Rank Fusion", (_active_filters(selected_authors, selected_companies, selected_states),),
+                   values, serialized)
 
 
+def build_elser_query(user_query, selected_authors, selected_states, selected_companies, serialized=False):
+    values = {"query": user_query, **_filter_values(selected_authors, selected_companies, selected_states)}
+    return _render("Elser", (_active_filters(selected_authors, selected_companies, selected_states),), values,
+                   serialized)
 
-import json
 
-def build_openai_query(embeddings, selected_states=[], selected_companies=[], optional_state=None):
+def build_openai_query(embeddings, selected_states=[], selected_companies=[], optional_state=None, serialized=False):
     """
-    Builds an Elasticsearch KNN query using OpenAI embeddings and includes aggregations.
+    Builds an Elasticsearch KNN query using OpenAI embeddings.
 
     Parameters:
     - embeddings: The vector embeddings.
     - selected_states (optional): List of selected states.
     - selected_companies (optional): List of selected companies.
     - optional_state (optional): State value for the should clause.
+    - serialized (optional): Return the body as JSON bytes.
 
     Returns:
     - A dictionary representing the Elasticsearch KNN query.
     """
+    values = {"vector": embeddings, "optional_state": optional_state,
+              **_filter_values(None, selected_companies, selected_states)}
+    variant = (_active_filters(None, selected_companies, selected_states), bool(optional_state))
+    return _render("Vector OpenAI", variant, values, serialized)
 
-    # Base KNN query structure
-    knn_query = {
-        "field": "vector_query_field.predicted_value",  # Field containing the OpenAI embeddings
-        "k": 10,
-        "num_candidates": 100,
-        "query_vector": embeddings
+
+def build_fusion_searches(user_query, selected_authors, selected_states, selected_companies, window_size,
+                          deadline_ms, retrievers=None):
+    """
+    Builds the retriever requests of a client-side fusion search.
+
+    Each retriever fetches window_size hits and is told to stop fusion_timeout_margin_ms before deadline_ms.
+    Returns:
+    - A list of (retriever name, index, JSON bytes body) for fusion.multi_search.
+    """
+    variant = (_active_filters(selected_authors, selected_companies, selected_states),)
+    values = {"query": user_query, "size": window_size, "num_candidates": max(100, window_size),
+              "timeout": f"{max(int(deadline_ms - fusion_timeout_margin_ms), 1)}ms", **_filter_values(selected_authors, selected_companies, selected_states)}
+    return [(name, index, query_templates.get(template_name, variant).render(values))
+            for name, (index, template_name) in fusion_retrievers.items() if retrievers is None or name in retrievers]
+
+
+def fusion_search(es, user_query, selected_authors, selected_states, selected_companies, method="rrf",
+                  rank_constant=60, window_size=50, weights=None, deadline_ms=None, size=10, retrievers=None):
+    """
+    Sends the BM25, MiniLM kNN and ELSER retrievers as one _msearch and fuses their rankings locally.
+
+    Hits are joined on _id, which the ingest derives from metadata.id and metadata.chunk for both indices.
+    The _msearch is cut off at deadline_ms; retrievers that miss it are dropped and the rest are still fused. Hits found only by ELSER get
+    their text copied to text_field, where the bym hits keep it.
+    Returns:
+    - A search-response-like dictionary with the fused hits and, under "fusion", the method and the
+      per-retriever report of fusion.multi_search (latencies, hit counts, dropped retrievers).
+    """
+    deadline_ms = deadline_ms or fusion_deadline_ms
+    searches = build_fusion_searches(user_query, selected_authors, selected_states, selected_companies, window_size,
+                                     deadline_ms, retrievers)
+    for name, _, body in searches:
+        dump_query(f"Fusion {name}", body)
+    hits, report = multi_search(es, searches, deadline_ms, msearch_filter_path)
+    fused = fuse(hits, method, weights if weights is not None else fusion_weights, rank_constant, size)
+    for hit in fused:
+        if "text_field" not in hit["_source"] and "text" in hit["_source"]:
+            hit["_source"] = {**hit["_source"], "text_field": hit["_source"]["text"]}
+
+    dropped = [name for name, retriever in report.items() if retriever.get("dropped")]
+    print("Fusion retrievers: " + ", ".join(f"{name} {retriever['took_ms']:.0f}ms"
+                                            + (" (dropped)" if retriever.get("dropped") else "")
+                                            for name, retriever in report.items() if retriever["took_ms"] is not None))
+    return {
+        "took": report["_msearch"]["took_ms"],
+        "timed_out": bool(dropped),
+        "hits": {"hits": fused},
+        "fusion": {"method": method, "retrievers": report}
     }
 
-    filters = []
-    bool_query = {}
 
-    # If states are selected, add the state filter
-    if selected_states:
-        filters.append({
-            "terms": {
-                "metadata.state.keyword": selected_states
-            }
-        })
+def build_facet_query(searchtype, selected_authors=None, selected_states=None, selected_companies=None,
+                      serialized=False):
+    """
+    Builds the facet request of a search type: its terms aggregations over the documents matching the
+    selected filters, without hits. The ada-002 index has no author, so its facets ignore author filters.
 
-    # If companies are selected, we'll add a filter
-    if selected_companies:
-        filters.append({
-            "terms": {
-                "metadata.company.keyword": selected_companies
-            }
-        })
+    Returns:
+    - A dictionary representing the Elasticsearch query, or its JSON bytes when serialized is set.
+    """
+    if searchtype == "Vector OpenAI":
+        selected_authors = None
+    values = _filter_values(selected_authors, selected_companies, selected_states)
+    return _render("Facets", (searchtype, _active_filters(selected_authors, selected_companies, selected_states)),
+                   values, serialized)
 
-    # If there's an optional_state, add the should clause
-    if optional_state:
-        bool_query["should"] = {
-            "term": {
-                "metadata.state.keyword": optional_state
-            }
-        }
 
-    # If there are any filters, add them to the bool query
-    if filters:
-        bool_query["filter"] = filters
+def get_facets(es, searchtype, selected_authors=None, selected_states=None, selected_companies=None):
+    """
+    Facet buckets for the facet panel, cached per index generation and filter set.
 
-    # If the bool_query is not empty, add it to the knn_query
-    if bool_query:
-        knn_query["filter"] = {
-            "bool": bool_query
-        }
+    The hit queries carry no aggregations; the panel calls this, or prefetch_facets while the search runs.
+    Returns:
+    - The aggregations of the facet request, e.g. {"author_facet": {"buckets": [...]}, ...}.
+    """
+    index = searchtype_facets[searchtype][0]
+    filters = {"authors": None if searchtype == "Vector OpenAI" else selected_authors, "states": selected_states,
+               "companies": selected_companies}
+    key = search_cache_key("", f"facets:{searchtype}", None, filters,
+                           index_generation(es, index, index_generation_check_interval))
+    aggregations = facet_cache.get(key)
+    if aggregations is None:
+        query = build_facet_query(searchtype, selected_authors, selected_states, selected_companies, serialized=True)
+        dump_query(f"{searchtype} facets", query)
+        aggregations = es.search(index=index, body=query, filter_path=facet_filter_path).get("aggregations", {})
+        facet_cache.put(key, aggregations)
+    return aggregations
 
-    # Final query structure including aggregations
-    full_query = {
-        "knn": knn_query,
-        "aggs": {
-            "company_facet": {
-                "terms": {
-                    "field": "metadata.company.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "state_facet": {
-                "terms": {
-                    "field": "metadata.state.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "tariff_category_facet": {
-                "terms": {
-                    "field": "metadata.tariff_type.keyword",
-                    "min_doc_count": 1
-                }
-            },
-            "tariff_type_facet": {
-                "terms": {
-                    "field": "metadata.tariff_type.keyword",
-                    "min_doc_count": 1
-                }
-            }
-        }
-    }
 
-    # Dump the assembled query for debugging
-    print(json.dumps(full_query, indent=4))
+def prefetch_facets(es, searchtype, selected_authors=None, selected_states=None, selected_companies=None):
+    """Starts get_facets in the background. Returns a Future whose result() are the aggregations."""
+    return pre_search_pool.submit(get_facets, es, searchtype, selected_authors, selected_states, selected_companies)
 
-    return full_query
+
+def dump_query(searchtype, query):
+    """Prints a query body when debug_queries is enabled in es_config."""
+    if debug_queries:
+        body = json.loads(query) if isinstance(query, bytes) else query
+        print(f"{searchtype} query:")
+        print(json.dumps(body, indent=4))
 
 
 def get_loc_entity(result):
@@ -682,11 +504,16 @@ def get_loc_entity(result):
 
 
 
-def run_ner_inference(es, input_text):
+def run_ner_inference(es, input_text, timeout_ms=None):
     docs = [{"text_field": input_text}]
 
-    # Use the infer_trained_model method
-    response = es.ml.infer_trained_model(model_id=ner_model, docs=docs)
+    if timeout_ms:
+        # Bound both the inference on the ML node and the client's wait for it
+        response = es.options(request_timeout=timeout_ms / 1000).ml.infer_trained_model(
+            model_id=ner_model, docs=docs, timeout=f"{int(timeout_ms)}ms")
+    else:
+        # Use the infer_trained_model method
+        response = es.ml.infer_trained_model(model_id=ner_model, docs=docs)
 
     return get_loc_entity(response)
 
@@ -694,66 +521,160 @@ def run_ner_inference(es, input_text):
 
 
 
+def openai_pre_search(es, user_query, deadline_ms=None):
+    """
+    Runs NER on the query in the background while the query is embedded on the request thread, so the
+    "Vector OpenAI" search waits for the slower of the two round trips instead of both.
+
+    The embedding stays on the calling thread, next to the completion calls that share the openai module.
+    The location filter is optional: when NER fails or is still running deadline_ms after the start, the
+    search goes ahead without it. The embedding is required and is always waited for.
+    Returns:
+    - A (query_vector, location) tuple; location is None when NER found none or did not make the deadline.
+    """
+    deadline_ms = deadline_ms or pre_search_deadline_ms
+    started = time.perf_counter()
+    ner = pre_search_pool.submit(run_ner_inference, es, user_query, deadline_ms)
+    query_vector = project_query_vector(get_embedding(user_query), ada002_projection_path)
+
+    remaining_ms = max(deadline_ms - (time.perf_counter() - started) * 1000, 0)
+    try:
+        location = ner.result(timeout=remaining_ms / 1000)
+    except TimeoutError:
+        print(f"NER did not finish within {deadline_ms} ms; searching without a location filter.")
+        location = None
+    except Exception as e:
+        print(f"NER failed: {e}. Searching without a location filter.")
+        location = None
+
+    print(f"Pre-search stage took {(time.perf_counter() - started) * 1000:.0f} ms")
+    return query_vector, location
+
+
+def _ranking_params(searchtype, BM25_Boost, KNN_Boost, rrf_rank_constant, rrf_window_size, fusion_method):
+    """The slider values that change the results of searchtype; the others do not belong in its cache key."""
+    if searchtype in ("Vector Hybrid", "Elser Hybrid"):
+        return {"bm25_boost": BM25_Boost, "knn_boost": KNN_Boost}
+    if searchtype == "Reciprocal Rank Fusion":
+        return {"rrf_rank_constant": rrf_rank_constant, "rrf_window_size": rrf_window_size}
+    if searchtype == "Client Fusion":
+        return {"fusion_method": fusion_method, "rank_constant": rrf_rank_constant, "window_size": rrf_window_size,
+                "weights": fusion_weights}
+    return {}
+
+
+def _is_complete(processed_results, results):
+    """
+    True when every result got its completion and no retriever was cut off, so a failed OpenAI call or a
+    partial fusion is never served from the cache.
+    """
+    if not results:
+        return len(processed_results) == 1
+    if results.get('timed_out'):
+        return False
+    hits = results.get('hits', {}).get('hits', [])
+    return len(processed_results) == min(5, len(hits))
+
+
 def search_tariffs(es, user_query, searchtype, BM25_Boost, KNN_Boost, rrf_rank_constant, rrf_window_size,
-                   selected_authors, selected_states, selected_companies):
+                   selected_authors, selected_states, selected_companies, use_cache=True, fusion_method="rrf"):
+    """
+    Runs a search and its OpenAI completions, or returns the cached answer to the same search.
+
+    Searches are cached by normalized query, search type, ranking parameters, selected filters and the
+    index generation they ran against, so a rebuild or reload of the index invalidates them. A cache hit
+    makes no Elasticsearch or OpenAI call apart from the periodic generation check. "Client Fusion" fuses
+    its retrievers with fusion_method, using the RRF sliders as rank constant and window size.
+    Returns:
+    - A (processed_results, results) tuple as returned by the openai_helper functions.
+    """
+    if not use_cache:
+        return _search_tariffs(es, user_query, searchtype, BM25_Boost, KNN_Boost, rrf_rank_constant,
+                               rrf_window_size, selected_authors, selected_states, selected_companies, fusion_method)
+
+    index = searchtype_indices.get(searchtype)
+    generation = index_generation(es, index, index_generation_check_interval) if index else ""
+    key = search_cache_key(user_query, searchtype,
+                           _ranking_params(searchtype, BM25_Boost, KNN_Boost, rrf_rank_constant, rrf_window_size,
+                                           fusion_method),
+                           {"authors": selected_authors, "states": selected_states,
+                            "companies": selected_companies},
+                           generation)
+    cached = search_cache.get(key)
+    if cached is not None:
+        print(f"{searchtype} results served from the search cache.")
+        return cached[0], cached[1]
+
+    processed_results, results = _search_tariffs(es, user_query, searchtype, BM25_Boost, KNN_Boost, rrf_rank_constant,
+                                                 rrf_window_size, selected_authors, selected_states,
+                                                 selected_companies, fusion_method)
+    # The cache keeps plain response bodies
+    results = getattr(results, "body", results)
+    if _is_complete(processed_results, results):
+        search_cache.put(key, [processed_results, results])
+    return processed_results, results
+
+
+def _search_tariffs(es, user_query, searchtype, BM25_Boost, KNN_Boost, rrf_rank_constant, rrf_window_size,
+                    selected_authors, selected_states, selected_companies, fusion_method="rrf"):
     # Select the appropriate query building function based on searchtype
+    query = None
     if searchtype == "Vector Hybrid":
-        query = build_hybrid_query(user_query, selected_authors, selected_states, selected_companies, BM25_Boost, KNN_Boost)
+        query = build_hybrid_query(user_query, selected_authors, selected_states, selected_companies, BM25_Boost, KNN_Boost, serialized=True)
     elif searchtype == "Vector":
-        query = build_knn_query(user_query, selected_authors, selected_states, selected_companies)
+        query = build_knn_query(user_query, selected_authors, selected_states, selected_companies, serialized=True)
     elif searchtype == "BM25":
-        query = build_bm25_query(user_query, selected_authors, selected_states, selected_companies)
+        query = build_bm25_query(user_query, selected_authors, selected_states, selected_companies, serialized=True)
     elif searchtype == "Reciprocal Rank Fusion":
-        query = build_rrf_query(user_query, selected_authors, selected_states, selected_companies, rrf_rank_constant, rrf_window_size)
+        query = build_rrf_query(user_query, selected_authors, selected_states, selected_companies, rrf_rank_constant, rrf_window_size, serialized=True)
     elif searchtype == "Elser":
-        query = build_elser_query(user_query, selected_authors, selected_states, selected_companies)
+        query = build_elser_query(user_query, selected_authors, selected_states, selected_companies, serialized=True)
     elif searchtype == "Elser Hybrid":
-        query = build_elser_hybrid_query(user_query, selected_authors, selected_states, selected_companies, BM25_Boost, KNN_Boost)
+        query = build_elser_hybrid_query(user_query, selected_authors, selected_states, selected_companies, BM25_Boost, KNN_Boost,
+                                         serialized=True)
     elif searchtype == "Vector OpenAI":
-        query = build_openai_query(get_embedding(user_query), selected_states, selected_companies, run_ner_inference(es, user_query))
+        query_vector, location = openai_pre_search(es, user_query)
+        query = build_openai_query(query_vector, selected_states, selected_companies, location, serialized=True)
+    elif searchtype == "Client Fusion":
+        print("Client Fusion runs its retrievers as one _msearch")
     elif searchtype == "GenAI":
         print("GenAI Search Only")
     else:
         raise ValueError(f"Invalid searchtype: {searchtype}")
 
-    if searchtype == "Vector OpenAI":
-        results = es.search(index=ada002_index_name, body=query, _source=True)
-    elif searchtype == "Elser" or searchtype == "Elser Hybrid":
-        results = es.search(index=elser_index_name, body=query, _source=True)
+    if query is not None:
+        dump_query(searchtype, query)
+
+    if searchtype == "Client Fusion":
+        results = fusion_search(es, user_query, selected_authors, selected_states, selected_companies, fusion_method,
+                                rrf_rank_constant, rrf_window_size)
     elif searchtype != "GenAI":
-        results = es.search(index=index_name, body=query, _source=True)
+        results = es.search(index=searchtype_indices[searchtype], body=query,
+                            source_includes=searchtype_source_includes[searchtype], filter_path=search_filter_path)
     else:
         results=[]
         print("GenAI Search Only")
 
     # Set a default value for num_results
     num_results = 0
-    authors = ""
+    # filter_path leaves out "hits" altogether when nothing matched
+    hits = results.get('hits', {}).get('hits', []) if results else []
     # Check if there are any hits
-    if results and results.get('hits') and results['hits'].get('hits'):
+    if hits:
         # Limit the number of results displayed
 
-        num_results = min(5, len(results['hits']['hits']))
+        num_results = min(5, len(hits))
 
         for i in range(num_results):
-            hit = results['hits']['hits'][i]
+            hit = hits[i]
             # Retrieve the game title and platform from _source or fields, depending on the structure of your results
-            if searchtype == "Vector OpenAI":
-                authors = []
-            else:
-                authors = [bucket['key'] for bucket in results['aggregations']['author_facet']['buckets']]
             if searchtype == "Elser" or searchtype == "Elser Hybrid":
-                text_list = [hit['_source']['text'] for hit in results['hits']['hits'] if 'text' in hit['_source']]
+                text_list = [hit['_source']['text'] for hit in hits if 'text' in hit['_source']]
             else:
-                text_list = [hit['_source']['text_field'] for hit in results['hits']['hits'] if
-                             'text_field' in hit['_source']]
+                text_list = [hit['_source']['text_field'] for hit in hits if 'text_field' in hit['_source']]
 
             # Print the results
-            print("Authors:")
-            for author in authors:
-                print(author)
-
-            print("\nTexts:")
+            print("Texts:")
             for text in text_list:
                 print(text)
                 print("-------------------------------")
@@ -0,0 +1,67 @@
+import json
+import re
+import threading
+
+from utils.ndjson_utils import dumps, get_decoder
+
+_slot_pattern = re.compile(r'"@@slot:(\w+)@@"')
+_loads = get_decoder()
+
+
+def slot(name):
+    """Placeholder for a per-request value in a query shape."""
+    return f"@@slot:{name}@@"
+
+
+class QueryTemplate:
+    """
+    A query body compiled once from a shape with slot() placeholders.
+
+    The shape is serialized at compile time and split around its slots, so rendering a request only
+    serializes the slot values (query text, vectors, filter values) and joins the pieces.
+    """
+
+    def __init__(self, shape):
+        self.shape = shape
+        parts = _slot_pattern.split(json.dumps(shape, separators=(",", ":")))
+        self._segments = [part.encode("utf-8") for part in parts[0::2]]
+        self.slots = parts[1::2]
+
+    def render(self, values):
+        """The request body as JSON bytes, ready to be sent as a pre-serialized body."""
+        pieces = [self._segments[0]]
+        for name, segment in zip(self.slots, self._segments[1:]):
+            pieces.append(dumps(values[name]))
+            pieces.append(segment)
+        return b"".join(pieces)
+
+    def fill(self, values):
+        """The request body as a dictionary."""
+        return _loads(self.render(values))
+
+
+class TemplateRegistry:
+    """
+    Compiles and caches one QueryTemplate per (name, variant), where variant is any hashable description
+    of the shape, e.g. which filters are present. shape_builders maps a name to a function that returns
+    the shape for a variant.
+    """
+
+    def __init__(self, shape_builders):
+        self.shape_builders = shape_builders
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, variant):
+        key = (name, variant)
+        template = self._templates.get(key)
+        if template is None:
+            with self._lock:
+                template = self._templates.get(key)
+                if template is None:
+                    template = QueryTemplate(self.shape_builders[name](*variant))
+                    self._templates[key] = template
+        return template
+
+    def __len__(self):
+        return len(self._templates)
@@ -0,0 +1,58 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Token buckets for requests per minute and tokens per minute, shared by every thread of the process.
+
+    acquire(tokens) blocks until both buckets have room; pause(seconds) holds all callers back, e.g. for a
+    server's Retry-After. A limit of None disables that bucket.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+        if self.tokens_per_minute:
+            self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+
+    def acquire(self, tokens=0):
+        # A single request larger than the whole bucket can never fit; let it through once the bucket is full
+        if self.tokens_per_minute:
+            tokens = min(tokens, self.tokens_per_minute)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._paused_until - now
+                if wait <= 0:
+                    waits = [0.0]
+                    if self.requests_per_minute and self._requests < 1:
+                        waits.append((1 - self._requests) * 60 / self.requests_per_minute)
+                    if self.tokens_per_minute and self._tokens < tokens:
+                        waits.append((tokens - self._tokens) * 60 / self.tokens_per_minute)
+                    wait = max(waits)
+                    if wait <= 0:
+                        if self.requests_per_minute:
+                            self._requests -= 1
+                        if self.tokens_per_minute:
+                            self._tokens -= tokens
+                        return
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            # Whatever capacity we thought we had was evidently not there
+            self._requests = min(self._requests, 0)
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from utils.embedding_cache import normalize_text
+
+_generations = {}
+_generations_lock = threading.Lock()
+
+
+def index_generation(es, index_name, check_interval=30):
+    """
+    Identifies the data an index name currently serves: the concrete indices behind it with their uuids.
+
+    A rebuild that moves the alias, or a full reload that recreates the index, changes the value. The
+    lookup is one get_settings call, remembered for check_interval seconds.
+    """
+    now = time.monotonic()
+    with _generations_lock:
+        cached = _generations.get(index_name)
+        if cached is not None and now - cached[0] < check_interval:
+            return cached[1]
+    settings = es.indices.get_settings(index=index_name, name="index.uuid")
+    generation = ",".join(f"{index}:{body['settings']['index']['uuid']}" for index, body in sorted(settings.items()))
+    with _generations_lock:
+        _generations[index_name] = (now, generation)
+    return generation
+
+
+def search_cache_key(user_query, searchtype, params=None, filters=None, generation=""):
+    """
+    Cache key of one search: the normalized, case-folded query, the search type, the parameters that
+    change its ranking, the selected filter values (order-insensitive) and the index generation.
+    """
+    key = {
+        "query": normalize_text(user_query).casefold(),
+        "searchtype": searchtype,
+        "params": params or {},
+        "filters": {name: sorted(values) for name, values in (filters or {}).items() if values},
+        "generation": generation
+    }
+    return hashlib.blake2b(json.dumps(key, sort_keys=True).encode("utf-8"), digest_size=16).hexdigest()
+
+
+class SearchResultCache:
+    """
+    Two-level cache of search results: an in-process LRU in front of an optional shared sqlite store.
+
+    Entries expire ttl seconds after they were stored. The in-process level keeps up to max_entries
+    results; the sqlite level (disk_path, WAL mode, one connection per thread) is shared by every app
+    process on the host and keeps up to disk_max_entries, evicting the least recently used. Values must
+    be JSON serializable to reach the disk level; tuples come back from it as lists.
+    """
+
+    def __init__(self, ttl=600, max_entries=256, disk_path=None, disk_max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk_path = disk_path
+        self.disk_max_entries = disk_max_entries
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            conn = self._conn()
+            conn.execute("CREATE TABLE IF NOT EXISTS results "
+                         "(key TEXT PRIMARY KEY, value TEXT, expires REAL, last_used REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+            conn.commit()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.disk_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _remember(self, key, expires, value):
+        with self._lock:
+            self._entries[key] = (expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key):
+        """The cached value of key, or None when it is missing or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+        if self.disk_path:
+            conn = self._conn()
+            row = conn.execute("SELECT value, expires FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] > now:
+                conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (now, key))
+                conn.commit()
+                value = json.loads(row[0])
+                self._remember(key, row[1], value)
+                with self._lock:
+                    self.disk_hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        now = time.time()
+        expires = now + self.ttl
+        self._remember(key, expires, value)
+        if self.disk_path:
+            conn = self._conn()
+            conn.execute("INSERT OR REPLACE INTO results (key, value, expires, last_used) VALUES (?, ?, ?, ?)",
+                         (key, json.dumps(value), expires, now))
+            conn.execute("DELETE FROM results WHERE expires <= ?", (now,))
+            conn.commit()
+            self._evict(conn)
+
+    def _evict(self, conn):
+        if not self.disk_max_entries:
+            return
+        excess = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0] - self.disk_max_entries
+        if excess > 0:
+            conn.execute("DELETE FROM results WHERE key IN "
+                         "(SELECT key FROM results ORDER BY last_used LIMIT ?)", (excess,))
+            conn.commit()
+
+    def clear(self):
+        """Drops every entry from both levels."""
+        with self._lock:
+            self._entries.clear()
+        if self.disk_path:
+            conn = self._conn()
+            conn.execute("DELETE FROM results")
+            conn.commit()
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,129 @@
+import time
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from utils.ndjson_utils import iter_ndjson
+from utils.vector_sidecar import get_field, has_sidecar, sidecar_paths
+
+similarities = ("dot_product", "cosine", "l2_norm", "max_inner_product")
+# Quantization levels Elasticsearch uses per index type
+quantization_levels = {"int8_hnsw": 127, "int4_hnsw": 15}
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Vector evaluation needs numpy. Install it with `pip install numpy`.")
+
+
+def load_vectors(file_path, field=None, limit=None):
+    """
+    Loads vectors as a float32 matrix from a .npy file, an NDJSON file's vector sidecar, or the dotted
+    field of an NDJSON file. Rows without a vector are skipped.
+    """
+    _require_numpy()
+    if file_path.endswith(".npy"):
+        matrix = np.load(file_path, mmap_mode='r')
+    elif has_sidecar(file_path):
+        matrix = np.load(sidecar_paths(file_path)[0], mmap_mode='r')
+    else:
+        if not field:
+            raise ValueError(f"{file_path} has no vector sidecar; name the vector field to read")
+        rows = []
+        for record in iter_ndjson(file_path):
+            vector = get_field(record, field)
+            if vector is not None:
+                rows.append(vector)
+                if limit and len(rows) >= limit:
+                    break
+        matrix = np.asarray(rows, dtype=np.float32)
+    matrix = np.asarray(matrix[:limit] if limit else matrix, dtype=np.float32)
+    return matrix[~np.isnan(matrix).any(axis=1)]
+
+
+def split_queries(matrix, query_count, seed=42):
+    """Holds out query_count random rows as queries. Returns (corpus, queries)."""
+    rng = np.random.default_rng(seed)
+    held_out = np.zeros(len(matrix), dtype=bool)
+    held_out[rng.choice(len(matrix), size=min(query_count, len(matrix) - 1), replace=False)] = True
+    return matrix[~held_out], matrix[held_out]
+
+
+def scores(queries, corpus, similarity="dot_product"):
+    """Higher-is-better scores of every query against every corpus row, as Elasticsearch ranks them."""
+    if similarity == "cosine":
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+        corpus = corpus / np.linalg.norm(corpus, axis=1, keepdims=True)
+    if similarity == "l2_norm":
+        return -(np.sum(queries ** 2, axis=1)[:, None] - 2 * queries @ corpus.T + np.sum(corpus ** 2, axis=1)[None, :])
+    return queries @ corpus.T
+
+
+def top_k(queries, corpus, k, similarity="dot_product", block_size=256):
+    """Exact top-k corpus row indices per query, best first; queries are scored block_size at a time."""
+    results = []
+    for start in range(0, len(queries), block_size):
+        block = scores(queries[start:start + block_size], corpus, similarity)
+        candidates = np.argpartition(-block, min(k, block.shape[1] - 1), axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(block, candidates, axis=1), axis=1)
+        results.append(np.take_along_axis(candidates, order, axis=1))
+    return np.vstack(results)
+
+
+def recall_at_k(approximate, exact):
+    """Mean fraction of the exact top-k that the approximate top-k found."""
+    k = exact.shape[1]
+    return float(np.mean([len(set(a[:k]) & set(e)) / k for a, e in zip(approximate, exact)]))
+
+
+def scalar_quantize(corpus, index_type="int8_hnsw", confidence_interval=None):
+    """
+    Simulates Elasticsearch's scalar quantization: values are clipped to a quantile range and rounded
+    to 127 (int8) or 15 (int4) levels. Returns the dequantized float32 matrix to score against.
+
+    The default confidence interval is 1 - 1/(dims + 1), as in Elasticsearch.
+    """
+    levels = quantization_levels[index_type]
+    confidence_interval = confidence_interval or 1 - 1 / (corpus.shape[1] + 1)
+    tail = (1 - confidence_interval) / 2
+    lower, upper = np.quantile(corpus, [tail, 1 - tail])
+    step = (upper - lower) / levels
+    quantized = np.round((np.clip(corpus, lower, upper) - lower) / step)
+    return (lower + quantized * step).astype(np.float32)
+
+
+def evaluate_quantization(corpus, queries, k=10, similarity="dot_product", index_types=("int8_hnsw", "int4_hnsw"),
+                          oversample=(1, 2, 4), confidence_interval=None):
+    """
+    recall@k of quantized against float brute-force search, with and without float rescoring of the
+    top k * oversample quantized candidates (oversample 1 is plain quantized search).
+
+    Returns:
+    - A list of result dictionaries, starting with the float baseline.
+    """
+    started = time.perf_counter()
+    exact = top_k(queries, corpus, k, similarity)
+    results = [{"index_type": "hnsw", "oversample": 1, "recall": 1.0,
+                "bytes_per_vector": corpus.shape[1] * 4,
+                "query_ms": (time.perf_counter() - started) * 1000 / len(queries)}]
+
+    for index_type in index_types:
+        quantized = scalar_quantize(corpus, index_type, confidence_interval)
+        for factor in oversample:
+            started = time.perf_counter()
+            candidates = top_k(queries, quantized, k * factor, similarity)
+            if factor > 1:
+                rescored = np.array([candidate[np.argsort(-scores(query[None, :], corpus[candidate], similarity)[0])]
+                                     for query, candidate in zip(queries, candidates)])
+            else:
+                rescored = candidates
+            results.append({
+                "index_type": index_type,
+                "oversample": factor,
+                "recall": recall_at_k(rescored[:, :k], exact),
+                "bytes_per_vector": corpus.shape[1] * (1 if index_type == "int8_hnsw" else 0.5) + 4,
+                "query_ms": (time.perf_counter() - started) * 1000 / len(queries)
+            })
+    return results
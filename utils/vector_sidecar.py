@@ -0,0 +1,181 @@
+import json
+import os
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from utils.manifest_utils import document_id
+from utils.ndjson_utils import dumps, iter_ndjson, open_ndjson_writer
+
+vector_dtypes = ("float32", "float16")
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Vector sidecars need numpy. Install it with `pip install numpy`.")
+
+
+def sidecar_paths(ndjson_path):
+    """(matrix_path, index_path) of the vector sidecar that belongs to an NDJSON file."""
+    return f"{ndjson_path}.vectors.npy", f"{ndjson_path}.vectors.json"
+
+
+def has_sidecar(ndjson_path):
+    return os.path.exists(sidecar_paths(ndjson_path)[1])
+
+
+def get_field(record, field):
+    value = record
+    for key in field.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def set_field(record, field, value):
+    keys = field.split(".")
+    target = record
+    for key in keys[:-1]:
+        target = target.setdefault(key, {})
+    target[keys[-1]] = value
+
+
+def pop_field(record, field):
+    keys = field.split(".")
+    target = record
+    for key in keys[:-1]:
+        target = target.get(key) if isinstance(target, dict) else None
+        if target is None:
+            return None
+    return target.pop(keys[-1], None) if isinstance(target, dict) else None
+
+
+class VectorSidecarWriter:
+    """
+    Streams vectors into a .npy matrix next to an NDJSON file, one row per record.
+
+    Rows are appended to a raw file while the record count is still unknown; close() prepends the .npy
+    header and writes the id index. Records without a vector get a row of NaNs.
+    """
+
+    def __init__(self, ndjson_path, field, dtype="float32"):
+        _require_numpy()
+        self.matrix_path, self.index_path = sidecar_paths(ndjson_path)
+        self.field = field
+        self.dtype = np.dtype(dtype)
+        self.dims = None
+        self.ids = []
+        self._raw_path = f"{self.matrix_path}.raw"
+        self._raw = open(self._raw_path, 'wb')
+        self._pending_missing = 0
+
+    def append(self, doc_id, vector):
+        if vector is None:
+            if self.dims is None:
+                # Dimensions are not known yet; emit the NaN rows once the first vector shows up
+                self._pending_missing += 1
+            else:
+                self._raw.write(np.full(self.dims, np.nan, dtype=self.dtype).tobytes())
+        else:
+            row = np.asarray(vector, dtype=self.dtype)
+            if self.dims is None:
+                self.dims = row.shape[0]
+                for _ in range(self._pending_missing):
+                    self._raw.write(np.full(self.dims, np.nan, dtype=self.dtype).tobytes())
+            elif row.shape[0] != self.dims:
+                raise ValueError(f"Vector for {doc_id} has {row.shape[0]} dims, expected {self.dims}")
+            self._raw.write(row.tobytes())
+        self.ids.append(doc_id)
+
+    def close(self):
+        self._raw.close()
+        dims = self.dims or 0
+        with open(self.matrix_path, 'wb') as out, open(self._raw_path, 'rb') as raw:
+            np.lib.format.write_array_header_1_0(out, {
+                "descr": np.lib.format.dtype_to_descr(self.dtype),
+                "fortran_order": False,
+                "shape": (len(self.ids), dims)
+            })
+            if dims:
+                while True:
+                    block = raw.read(16 * 1024 * 1024)
+                    if not block:
+                        break
+                    out.write(block)
+        os.remove(self._raw_path)
+
+        with open(self.index_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                "field": self.field,
+                "dtype": self.dtype.name,
+                "dims": dims,
+                "count": len(self.ids),
+                "ids": self.ids
+            }, f)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class VectorSidecar:
+    """Read side of a sidecar: the matrix is memory-mapped, so rows are views and are never copied into RAM."""
+
+    def __init__(self, ndjson_path):
+        _require_numpy()
+        matrix_path, index_path = sidecar_paths(ndjson_path)
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        self.field = index["field"]
+        self.dims = index["dims"]
+        self.matrix = np.load(matrix_path, mmap_mode='r')
+        self.rows = {doc_id: row for row, doc_id in enumerate(index["ids"])}
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def row(self, position):
+        return self.matrix[position]
+
+    def get(self, doc_id):
+        """Vector of a document, or None if it has no (or a NaN) row."""
+        position = self.rows.get(doc_id)
+        if position is None:
+            return None
+        vector = self.matrix[position]
+        if np.isnan(vector[0]):
+            return None
+        return vector
+
+
+# Parse workers open each sidecar once and keep it mapped for the rest of the run
+_open_sidecars = {}
+
+
+def open_sidecar(ndjson_path):
+    if ndjson_path not in _open_sidecars:
+        _open_sidecars[ndjson_path] = VectorSidecar(ndjson_path)
+    return _open_sidecars[ndjson_path]
+
+
+def split_vectors(src_path, dest_path, field, dtype="float32"):
+    """
+    Converts an NDJSON export with inline vectors into the sidecar layout.
+
+    dest_path receives the records without field (compressed by suffix); the vectors go to the
+    matrix and id index next to it. Returns the number of records written.
+    """
+    count = 0
+    with open_ndjson_writer(dest_path) as out, VectorSidecarWriter(dest_path, field, dtype) as writer:
+        for record in iter_ndjson(src_path):
+            vector = pop_field(record, field)
+            source = dumps(record)
+            writer.append(document_id(record, source), vector)
+            out.write(source + b"\n")
+            count += 1
+    return count
@@ -9,3 +9,16 @@ openai_completion_deployment_name = "gpt35turbo"
 openai_completion_large_deployment_name = "gpt-35-turbo-16k"
 
 ner_model = "elastic__distilbert-base-cased-finetuned-conll03-english"
+
+# Azure ada-002 deployment limits. Inputs per request and tokens per input are service limits;
+# the per-minute quotas are whatever the deployment was provisioned with.
+openai_embedding_max_inputs = 16
+openai_embedding_max_input_tokens = 8191
+openai_embedding_max_request_tokens = 8191 * 4
+openai_embedding_requests_per_minute = 720
+openai_embedding_tokens_per_minute = 120000
+
+# Persistent ada-002 embedding cache shared by the app and ingest runs; off while the path is None. For example
+# "/abs/path/to/output/embedding_cache.sqlite" (output/embedding_cache.sqlite* is git-ignored).
+openai_embedding_cache_path = None
+openai_embedding_cache_max_entries = 50000